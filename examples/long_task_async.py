@@ -0,0 +1,26 @@
+import uasyncio as asyncio
+from scron.week import simple_cron
+from scron.decorators import debug_call
+
+
+@debug_call
+def some_counter(scorn_instance, callback_name, pointer, memory):
+    if 'counter' in memory:
+        memory['counter'] += 1
+    else:
+        memory['counter'] = 1
+
+
+async def long_task(scorn_instance, callback_name, pointer, memory):
+    if 'counter' in memory:
+        memory['counter'] += 1
+    else:
+        memory['counter'] = 1
+    # It does not delay the other callbacks.
+    await asyncio.sleep(20)
+    print('long task end', pointer, memory['counter'])
+
+
+simple_cron.add('every 10 seconds', long_task, seconds=range(0, 59, 10))
+simple_cron.add('every 2 seconds', some_counter, seconds=range(0, 59, 2))
+asyncio.run(simple_cron.run_async())
@@ -1,8 +1,9 @@
 class Timer:
+    ONE_SHOT = 0
+    PERIODIC = 1
 
     def __init__(*args, **kwarg):
         pass
 
     def __getattr__(self, item):
         return ''
-
@@ -18,7 +18,19 @@ def time(*args, **kwarg):
 
 
 def ticks_ms(*args, **kwarg):
-    return int(_time.time() % 1 * 1000)
+    return int(_time.time() * 1000)
+
+
+def ticks_us(*args, **kwarg):
+    return int(_time.time() * 1000000)
+
+
+def ticks_add(ticks, delta):
+    return ticks + delta
+
+
+def ticks_diff(ticks1, ticks2):
+    return ticks1 - ticks2
 
 
 def mktime(*args, **kwarg):
@@ -1,17 +1,161 @@
 # Copyright 2019 Wojciech Banaś
 # This code is released under the GPL3 or individual commercial license.
 
+import gc
+
 from machine import Timer
-from utime import localtime, sleep_ms, time, ticks_ms
+from utime import localtime, sleep_ms, time, ticks_ms, ticks_us, ticks_add, ticks_diff
 
+from scron.helpers import array
 from scron.scount import SimpleCounter
 
 
+def get_asyncio():
+    """\
+    Returns the uasyncio module on MicroPython, or the asyncio module on Python 3.
+    """
+    try:
+        import uasyncio as asyncio
+    except ImportError:
+        import asyncio
+    return asyncio
+
+
+class Batch:
+    """\
+    Context manager which postpones rescheduling of SimpleCRON until the end of the block.
+
+    At the end of the outermost block the garbage is collected once and the timer is set once.
+    """
+
+    def __init__(self, simple_cron, collect_garbage=True):
+        """\
+        :param simple_cron: SimpleCRON instance
+        :param collect_garbage: boolean, False if the garbage is collected by the caller after the block
+        """
+        self.simple_cron = simple_cron
+        self.collect_garbage = collect_garbage
+
+    def __enter__(self):
+        self.simple_cron._batch_level += 1
+        return self.simple_cron
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        simple_cron = self.simple_cron
+        simple_cron._batch_level -= 1
+        if simple_cron._batch_level == 0 and simple_cron._batch_changed:
+            simple_cron._batch_changed = False
+            if self.collect_garbage:
+                simple_cron._collect_garbage(False)
+            simple_cron._first_step()
+        return False
+
+
 class SimpleCRONBase(SimpleCounter):
+    # Changes of the time table made by the callbacks are queued and applied after all callbacks of the step.
+    QUEUE_CHANGES = False
+
+    # The maximum number of coroutine callbacks running at the same time, the next ones wait for their turn.
+    # 0 - no limit
+    COROUTINES_LIMIT = 4
+
+    # Garbage collection policies:
+    # the garbage is not collected by SimpleCRON
+    GC_NEVER = 0
+    # after the callbacks of each step and after each change of the time table
+    GC_EVERY_TICK = 1
+    # as GC_EVERY_TICK, but only if gc.mem_free() is lower than GC_MEM_FREE_MIN (on Python 3 as GC_NEVER)
+    GC_THRESHOLD = 2
+    # after the callbacks of every GC_TICKS steps
+    GC_EVERY_N_TICKS = 3
+    GC_POLICY = GC_EVERY_TICK
+    # Free memory in bytes, below which the garbage is collected, used by GC_THRESHOLD.
+    GC_MEM_FREE_MIN = 16384
+    # The number of steps between collections, used by GC_EVERY_N_TICKS.
+    GC_TICKS = 10
+    # Positions in the garbage collection timing array, see stats().
+    GC_COLLECTIONS = 0
+    GC_LAST = 1
+    GC_MAX = 2
+    GC_TOTAL_MS = 3
+    GC_TOTAL_REMAINDER_US = 4
+
+    # Whether the durations and the lateness of the callbacks and the lateness of the timer wake-ups are recorded,
+    # see stats(). It is off by default, so the callbacks are not timed and no statistics are allocated.
+    STATS = False
+    # Timing of the callbacks is stored in memory[SimpleCRON.TIMING_ID] of each callback, see stats().
+    TIMING_ID = '__timing'
+    # The number of buckets of the histogram of the callback durations.
+    # Bucket 0: 0-1 us, bucket N: 2^N - 2^(N+1)-1 us, the last bucket: all longer durations.
+    TIMING_BUCKETS = 24
+    # Positions in the timing array, the histogram buckets follow them.
+    TIMING_RUNS = 0
+    TIMING_LAST = 1
+    TIMING_MAX = 2
+    TIMING_HISTOGRAM = 3
+
+    # Lateness of the callback starts is stored in memory[SimpleCRON.LATENESS_ID] of each callback, see stats().
+    LATENESS_ID = '__lateness'
+    # The number of buckets of the histogram of the lateness.
+    # Bucket 0: on time or early, bucket N: 2^(N-1) - 2^N-1 ms, the last bucket: all longer delays.
+    LATENESS_BUCKETS = 16
+    # The rolling min/avg/max cover the last LATENESS_WINDOW to 2 * LATENESS_WINDOW calls.
+    LATENESS_WINDOW = 32
+    # Positions in the lateness array: the number of calls, the current and the previous window,
+    # the histogram buckets follow them.
+    LATENESS_COUNT = 0
+    LATENESS_WINDOW_COUNT = 1
+    LATENESS_MIN = 2
+    LATENESS_MAX = 3
+    LATENESS_SUM = 4
+    LATENESS_PREVIOUS_COUNT = 5
+    LATENESS_PREVIOUS_MIN = 6
+    LATENESS_PREVIOUS_MAX = 7
+    LATENESS_PREVIOUS_SUM = 8
+    LATENESS_HISTOGRAM = 9
+
+    # Events of the hooks, see add_hook().
+    HOOK_BEFORE_TICK = 'before_tick'
+    HOOK_AFTER_TICK = 'after_tick'
+    HOOK_BEFORE_CALLBACK = 'before_callback'
+    HOOK_AFTER_CALLBACK = 'after_callback'
+    HOOK_RESCHEDULE = 'reschedule'
 
     def __init__(self, *args, **kwargs):
         super(SimpleCRONBase, self).__init__(*args, **kwargs)
         self.timer = None
+        # Nesting level of the batch() blocks.
+        self._batch_level = 0
+        # Whether the rescheduling was postponed in the batch() block.
+        self._batch_changed = False
+        # The next call: (<pointer>, <ticks_ms() deadline>) or None
+        self.deadline = None
+        # The last call pointer of the timer step.
+        self._last_time_pointer = None
+        # The bound method is created once, so the timer gets the same callback on each step.
+        self._timer_callback = self._timer_step
+        # Changes queued during the run of callbacks: [(<function>, <args>, <kwargs>), ...] or None
+        self._changes_queue = None
+        # Event of the asyncio driver, which is set after each change of the time table, see run_async().
+        self._wakeup = None
+        # The number of running coroutine callbacks.
+        self._coroutines_running = 0
+        # Coroutine callbacks waiting for their turn: [<coroutine>, ...]
+        self._coroutines_pending = []
+        # The planned call of the running step: (<pointer>, <ticks_ms() deadline>) or None
+        self._last_deadline = None
+        # Lateness of the timer wake-ups, created at the first recorded wake-up, see stats().
+        self._wake_lateness = None
+        # Hooks of the events, empty tuples cost nothing, see add_hook().
+        self._hooks_before_tick = ()
+        self._hooks_after_tick = ()
+        self._hooks_before_callback = ()
+        self._hooks_after_callback = ()
+        self._hooks_reschedule = ()
+        # Timing of the garbage collections, see stats().
+        self._gc_timing = array('I', [0] * 5)
+        # The number of steps since the last collection, used by GC_EVERY_N_TICKS.
+        self._gc_ticks = 0
 
     def _sync_time(self):
         "Synchronizes SimpleCRON with time."
@@ -31,14 +175,29 @@ class SimpleCRONBase(SimpleCounter):
                 return (self._get_time_change_pointer() + 1) % 1000
             sleep_ms(1)
 
+    async def _estimate_time_change_async(self):
+        """\
+        Estimate the time change, like _estimate_time_change(), but the event loop is not blocked.
+        :return:
+        """
+        asyncio = get_asyncio()
+        last = int(time()) + 1
+        while 1:
+            current = int(time())
+            if current > last:
+                return (self._get_time_change_pointer() + 1) % 1000
+            await asyncio.sleep(0.001)
+
     def _set_time_change(self, time_change):
         self.time_change = time_change
 
     def _get_time_change_pointer(self):
         return ticks_ms()
 
-    def _get_time_change_correction(self, delta_time_ms):
-        current = self._get_time_change_pointer() % 1000
+    def _get_time_change_correction(self, delta_time_ms, time_change_pointer=None):
+        if time_change_pointer is None:
+            time_change_pointer = self._get_time_change_pointer()
+        current = time_change_pointer % 1000
         # Immediate triggering
         # There may also be no negative values of
         if current >= self.time_change:
@@ -51,9 +210,17 @@ class SimpleCRONBase(SimpleCounter):
             return out
 
     def _first_step(self):
+        if self._batch_level > 0:
+            self._batch_changed = True
+            return
+        if self._wakeup is not None:
+            # The asyncio driver calculates the next call again.
+            self._wakeup.set()
         if self.timer == None:
             return
         self.timer.deinit()
+        # The timer is set again, so the next step is not a planned wake-up, see _start_step().
+        self.deadline = None
         if len(self.callbacks) > 0:
             next_pointer = self.get_next_pointer(*self.get_current_pointer())
             if next_pointer == None:
@@ -64,30 +231,498 @@ class SimpleCRONBase(SimpleCounter):
                 return
             self.next_step(*next_pointer)(self.timer)
 
+    def add_hook(self, event, hook):
+        """\
+        Adds the function, which is called at the event of the scheduler, e.g. by a profiler, tracer or watchdog.
+
+        Events and the arguments of the hook:
+
+        * HOOK_BEFORE_TICK - hook(<SimpleCRON_instance>, <pointer>), before the callbacks of the pointer,
+        * HOOK_AFTER_TICK - hook(<SimpleCRON_instance>, <pointer>, <duration in us>), after the callbacks,
+        * HOOK_BEFORE_CALLBACK - hook(<SimpleCRON_instance>, <callback_name>, <pointer>, <lateness in ms or None>),
+        * HOOK_AFTER_CALLBACK - hook(<SimpleCRON_instance>, <callback_name>, <pointer>, <duration in us>),
+        * HOOK_RESCHEDULE - hook(<SimpleCRON_instance>, <deadline>), after the next call is planned,
+          deadline: (<pointer>, <ticks_ms() deadline>) or None.
+
+        Exceptions of the hooks are passed to the callback_exception_processors.
+
+        :param event: SimpleCRON.HOOK_*
+        :param hook: function
+        """
+        attribute = self._get_hooks_attribute(event)
+        setattr(self, attribute, getattr(self, attribute) + (hook,))
+
+    def remove_hook(self, event, hook):
+        """\
+        Removes the function added by add_hook().
+
+        :param event: SimpleCRON.HOOK_*
+        :param hook: function
+        """
+        attribute = self._get_hooks_attribute(event)
+        setattr(self, attribute, tuple([h for h in getattr(self, attribute) if h != hook]))
+
+    def _get_hooks_attribute(self, event):
+        if event not in (self.HOOK_BEFORE_TICK, self.HOOK_AFTER_TICK, self.HOOK_BEFORE_CALLBACK,
+                         self.HOOK_AFTER_CALLBACK, self.HOOK_RESCHEDULE):
+            raise Exception('Unknown hook event: %s' % event)
+        return '_hooks_' + event
+
+    def _call_hooks(self, hooks, args):
+        for hook in hooks:
+            try:
+                hook(*args)
+            except Exception as e:
+                for processor in self.callback_exception_processors:
+                    processor(e)
+
+    def _set_deadline(self, deadline):
+        """\
+        Sets the next planned call.
+
+        :param deadline: (<pointer>, <ticks_ms() deadline>) or None
+        """
+        self.deadline = deadline
+        if self._hooks_reschedule:
+            self._call_hooks(self._hooks_reschedule, (self, deadline))
+
+    def _get_mem_free(self):
+        """\
+        :return: free memory in bytes, or None if it is not known (Python 3)
+        """
+        try:
+            return gc.mem_free()
+        except AttributeError:
+            return None
+
+    def _collect_garbage(self, tick):
+        """\
+        Collects the garbage according to the GC_POLICY, and records the time of the collection.
+
+        :param tick: boolean, True after the callbacks of a step, False after a change of the time table
+        """
+        policy = self.GC_POLICY
+        if policy == self.GC_NEVER:
+            return
+        if policy == self.GC_THRESHOLD:
+            mem_free = self._get_mem_free()
+            if mem_free is None or mem_free >= self.GC_MEM_FREE_MIN:
+                return
+        elif policy == self.GC_EVERY_N_TICKS:
+            if not tick:
+                return
+            self._gc_ticks += 1
+            if self._gc_ticks < self.GC_TICKS:
+                return
+            self._gc_ticks = 0
+        start = ticks_us()
+        gc.collect()
+        duration_us = ticks_diff(ticks_us(), start)
+        gc_timing = self._gc_timing
+        gc_timing[self.GC_COLLECTIONS] += 1
+        gc_timing[self.GC_LAST] = duration_us
+        if duration_us > gc_timing[self.GC_MAX]:
+            gc_timing[self.GC_MAX] = duration_us
+        # The total time is counted in ms, so it does not overflow.
+        duration_us += gc_timing[self.GC_TOTAL_REMAINDER_US]
+        gc_timing[self.GC_TOTAL_MS] += duration_us // 1000
+        gc_timing[self.GC_TOTAL_REMAINDER_US] = duration_us % 1000
+
+    def _queue_change(self, function, args, kwargs):
+        """\
+        Queues the change of the time table, if it is made by a callback in the QUEUE_CHANGES mode.
+
+        :param function: function(*args, **kwargs), which makes the change
+        :return: boolean, True if the change has been queued
+        """
+        if self._changes_queue is None:
+            return False
+        self._changes_queue.append((function, args, kwargs))
+        return True
+
+    def _timer_step(self, timer):
+        """\
+        Runs the callbacks of the last call pointer and sets the timer for the next call.
+
+        :param timer: timer instance
+        """
+        raise NotImplementedError()
+
     def _wait_for_unlock_rw(self):
         """\
         Waiting for the lock to be removed
+
+        Changes made by another thread are waited for on the lock, without a busy wait.
+        The interrupted changes of the current thread cannot be waited for, then an error is emitted.
         """
-        # We wait 5 seconds, if the lock is not removed then we emit an error.
-        from utime import sleep_ms
-        for i in range(5000):
-            sleep_ms(1)
-            if not self._lock_rw:
-                return
-        raise Exception('Too long to wait for the lock to be removed!')
+        if not self._can_read():
+            raise Exception('The time table is being changed by the interrupted code!')
+
+    def add_many(self, entries):
+        """\
+        Adds many entries with a single rescheduling.
+
+        If one of the entries is invalid, then the entries added before it are removed, and the exception is raised.
+
+        :param entries: list of add() arguments, each as a dictionary or as a tuple,
+            eg. [{'callback_name': 'a', 'callback': callback_a, 'seconds': 0}, ('b', callback_b), ...]
+        :return: None
+        """
+        added = []
+        with self.batch():
+            try:
+                for entry in entries:
+                    if type(entry) is dict:
+                        callback_name = entry['callback_name']
+                        callback_new = callback_name not in self.callbacks
+                        self.add(**entry)
+                    else:
+                        callback_name = entry[0]
+                        callback_new = callback_name not in self.callbacks
+                        self.add(*entry)
+                    if callback_new:
+                        added.append(callback_name)
+            except Exception:
+                for callback_name in added:
+                    self.remove(callback_name, force=True)
+                raise
+
+    def batch(self):
+        """\
+        Returns the context manager, which postpones rescheduling until the end of the block.
+
+        Example:
+        with simple_cron.batch():
+            simple_cron.add('a', callback_a, seconds=0)
+            simple_cron.add('b', callback_b, seconds=30)
+
+        :return: Batch
+        """
+        return Batch(self)
 
     def remove(self, callback_name, force=False, _lock=True):
         """
         Removes from the counters a callback that occurs under ID callback_name.
 
         Recalculates the nearest callback to call.
+        If it is called by a callback in the QUEUE_CHANGES mode, the callback is removed after all callbacks of the step.
 
         :param force: force removal of the callback.
         :param callback_name: callback name
         """
+        if self._queue_change(self.remove, (callback_name, force, _lock), {}):
+            return
+        if callback_name not in self.callbacks:
+            return
         super(SimpleCRONBase, self).remove(callback_name, force, _lock)
         self._first_step()
 
+    def remove_many(self, callback_names=(), predicate=None, force=False, _lock=True):
+        """
+        Removes many callbacks from the counters, in one pass over the time table.
+
+        Recalculates the nearest callback to call once.
+
+        :param callback_names: list of callback name IDs, if one of them cannot be removed, then an exception is raised
+        :param predicate: function(callback_name) -> boolean, selects the callbacks to remove,
+            callbacks that cannot be removed are skipped
+        :param force: force removal of the callbacks.
+        :return: set of the removed callback names, empty if the removal has been queued (QUEUE_CHANGES)
+        """
+        if self._queue_change(self.remove_many, (callback_names, predicate, force, _lock), {}):
+            return set()
+        removed = super(SimpleCRONBase, self).remove_many(callback_names, predicate, force, _lock)
+        if len(removed) > 0:
+            self._first_step()
+        return removed
+
+    def _call_callback(self, callback_name, callback, memory, pointer):
+        """\
+        Calls the callback, exceptions are passed to the callback_exception_processors.
+
+        A coroutine returned by the callback (async def) is started as a task of the run_async() event loop,
+        so the coroutine callbacks run concurrently, up to COROUTINES_LIMIT at the same time.
+
+        :param callback_name: callback name ID
+        :param callback: callable(<SimpleCRON_instance>, <callback_name>, <current_pointer>, <memory>)
+        :param memory: memory of the callback
+        :param pointer: index 0 -> highest counter
+        """
+        last_deadline = self._last_deadline
+        lateness_ms = None
+        if (self.STATS or self._hooks_before_callback) and \
+                last_deadline is not None and last_deadline[0] == pointer:
+            lateness_ms = ticks_diff(self._get_time_change_pointer(), last_deadline[1])
+            if self.STATS:
+                lateness = memory.get(self.LATENESS_ID)
+                if lateness is None:
+                    lateness = self._new_lateness()
+                    memory[self.LATENESS_ID] = lateness
+                self._record_lateness(lateness, lateness_ms)
+        if self._hooks_before_callback:
+            self._call_hooks(self._hooks_before_callback, (self, callback_name, pointer, lateness_ms))
+        # The call is timed only for the statistics or the hooks.
+        timed = self.STATS or self._hooks_after_callback
+        if timed:
+            start = ticks_us()
+        try:
+            out = callback(self, callback_name, pointer, memory)
+            if out is not None and hasattr(out, 'send'):
+                self._start_coroutine(out)
+        except Exception as e:
+            for processor in self.callback_exception_processors:
+                processor(e)
+        if timed:
+            duration_us = ticks_diff(ticks_us(), start)
+            if self.STATS:
+                self._record_timing(memory, duration_us)
+            if self._hooks_after_callback:
+                self._call_hooks(self._hooks_after_callback, (self, callback_name, pointer, duration_us))
+
+    def _record_timing(self, memory, duration_us):
+        """\
+        Records the duration of the callback call.
+
+        The timing array is created at the first call of the callback, so nothing is allocated on the next calls.
+
+        :param memory: memory of the callback
+        :param duration_us: duration of the call in microseconds
+        """
+        timing = memory.get(self.TIMING_ID)
+        if timing is None:
+            timing = array('I', [0] * (self.TIMING_HISTOGRAM + self.TIMING_BUCKETS))
+            memory[self.TIMING_ID] = timing
+        timing[self.TIMING_RUNS] += 1
+        timing[self.TIMING_LAST] = duration_us
+        if duration_us > timing[self.TIMING_MAX]:
+            timing[self.TIMING_MAX] = duration_us
+        bucket = 0
+        while duration_us > 1 and bucket < self.TIMING_BUCKETS - 1:
+            duration_us >>= 1
+            bucket += 1
+        timing[self.TIMING_HISTOGRAM + bucket] += 1
+
+    def _new_lateness(self):
+        return array('i', [0] * (self.LATENESS_HISTOGRAM + self.LATENESS_BUCKETS))
+
+    def _record_lateness(self, lateness, lateness_ms):
+        """\
+        Records the lateness of the planned call.
+
+        :param lateness: lateness array, see _new_lateness()
+        :param lateness_ms: difference between the actual and the planned time in milliseconds
+        """
+        if lateness[self.LATENESS_WINDOW_COUNT] >= self.LATENESS_WINDOW:
+            # The current window becomes the previous one.
+            lateness[self.LATENESS_PREVIOUS_COUNT] = lateness[self.LATENESS_WINDOW_COUNT]
+            lateness[self.LATENESS_PREVIOUS_MIN] = lateness[self.LATENESS_MIN]
+            lateness[self.LATENESS_PREVIOUS_MAX] = lateness[self.LATENESS_MAX]
+            lateness[self.LATENESS_PREVIOUS_SUM] = lateness[self.LATENESS_SUM]
+            lateness[self.LATENESS_WINDOW_COUNT] = 0
+            lateness[self.LATENESS_SUM] = 0
+        if lateness[self.LATENESS_WINDOW_COUNT] == 0 or lateness_ms < lateness[self.LATENESS_MIN]:
+            lateness[self.LATENESS_MIN] = lateness_ms
+        if lateness[self.LATENESS_WINDOW_COUNT] == 0 or lateness_ms > lateness[self.LATENESS_MAX]:
+            lateness[self.LATENESS_MAX] = lateness_ms
+        lateness[self.LATENESS_WINDOW_COUNT] += 1
+        lateness[self.LATENESS_SUM] += lateness_ms
+        lateness[self.LATENESS_COUNT] += 1
+        bucket = 0
+        while lateness_ms > 0 and bucket < self.LATENESS_BUCKETS - 1:
+            lateness_ms >>= 1
+            bucket += 1
+        lateness[self.LATENESS_HISTOGRAM + bucket] += 1
+
+    def _lateness_stats(self, lateness):
+        count = 0 if lateness is None else lateness[self.LATENESS_COUNT]
+        if count == 0 or lateness[self.LATENESS_WINDOW_COUNT] == 0:
+            return {
+                'count': 0,
+                'min_ms': 0,
+                'avg_ms': 0,
+                'max_ms': 0,
+                'histogram': (0,) * self.LATENESS_BUCKETS,
+            }
+        window_count = lateness[self.LATENESS_WINDOW_COUNT]
+        min_ms = lateness[self.LATENESS_MIN]
+        max_ms = lateness[self.LATENESS_MAX]
+        sum_ms = lateness[self.LATENESS_SUM]
+        if lateness[self.LATENESS_PREVIOUS_COUNT] > 0:
+            window_count += lateness[self.LATENESS_PREVIOUS_COUNT]
+            min_ms = min(min_ms, lateness[self.LATENESS_PREVIOUS_MIN])
+            max_ms = max(max_ms, lateness[self.LATENESS_PREVIOUS_MAX])
+            sum_ms += lateness[self.LATENESS_PREVIOUS_SUM]
+        return {
+            'count': count,
+            'min_ms': min_ms,
+            'avg_ms': sum_ms / window_count,
+            'max_ms': max_ms,
+            'histogram': tuple(lateness[self.LATENESS_HISTOGRAM:]),
+        }
+
+    def _start_step(self, last_time_pointer, deadline):
+        """\
+        Records the lateness of the timer wake-up (if STATS is set), before the callbacks of the step are run.
+
+        :param last_time_pointer: call pointer of the step
+        :param deadline: the planned call (<pointer>, <ticks_ms() deadline>) or None
+        """
+        if deadline is None or deadline[0] != last_time_pointer:
+            # The step was not planned, e.g. the first step or the time table has been changed.
+            return
+        self._last_deadline = deadline
+        if self.STATS:
+            if self._wake_lateness is None:
+                self._wake_lateness = self._new_lateness()
+            self._record_lateness(self._wake_lateness, ticks_diff(self._get_time_change_pointer(), deadline[1]))
+
+    def reset_stats(self):
+        """\
+        Clears the lateness statistics.
+        """
+        if self._wake_lateness is not None:
+            for index in range(len(self._wake_lateness)):
+                self._wake_lateness[index] = 0
+        for memory in self.callbacks_memory.values():
+            lateness = memory.get(self.LATENESS_ID)
+            if lateness is not None:
+                for index in range(len(lateness)):
+                    lateness[index] = 0
+
+    def stats(self, callback_name=None):
+        """\
+        Returns the timing statistics of the callbacks and of the garbage collection.
+
+        The durations and the lateness are recorded only if STATS is set.
+        For the coroutine callbacks only the start of the coroutine is measured (the time to the first await).
+
+        The lateness is the time between the planned and the actual wake-up of the timer (wake_lateness),
+        or the start of the callback (lateness of each callback). The min/avg/max are rolling, they cover
+        the last LATENESS_WINDOW to 2 * LATENESS_WINDOW calls. The count and the histogram are counted since
+        the start or reset_stats().
+
+        :param callback_name: callback name ID, None - all callbacks
+        :return: dict(
+            wake_lateness=<lateness>,
+            callbacks={<callback_name>: dict(runs=<number of calls>, last_us=<duration of the last call>,
+                max_us=<the longest duration>, histogram=<tuple of TIMING_BUCKETS counters>,
+                lateness=<lateness>), ...}
+            gc=dict(collections=<number of the garbage collections>, last_us=..., max_us=..., total_ms=...),
+        ), where <lateness> is dict(count=<number of calls>, min_ms=..., avg_ms=..., max_ms=...,
+            histogram=<tuple of LATENESS_BUCKETS counters>)
+        """
+        if callback_name is None:
+            callback_names = list(self.callbacks_memory.keys())
+        else:
+            callback_names = [callback_name]
+        callbacks = {}
+        for callback_name in callback_names:
+            memory = self.callbacks_memory[callback_name]
+            timing = memory.get(self.TIMING_ID)
+            if timing is None:
+                callbacks[callback_name] = {
+                    'runs': 0,
+                    'last_us': 0,
+                    'max_us': 0,
+                    'histogram': (0,) * self.TIMING_BUCKETS,
+                }
+            else:
+                callbacks[callback_name] = {
+                    'runs': timing[self.TIMING_RUNS],
+                    'last_us': timing[self.TIMING_LAST],
+                    'max_us': timing[self.TIMING_MAX],
+                    'histogram': tuple(timing[self.TIMING_HISTOGRAM:]),
+                }
+            callbacks[callback_name]['lateness'] = self._lateness_stats(memory.get(self.LATENESS_ID))
+        return {
+            'wake_lateness': self._lateness_stats(self._wake_lateness),
+            'callbacks': callbacks,
+            'gc': {
+                'collections': self._gc_timing[self.GC_COLLECTIONS],
+                'last_us': self._gc_timing[self.GC_LAST],
+                'max_us': self._gc_timing[self.GC_MAX],
+                'total_ms': self._gc_timing[self.GC_TOTAL_MS],
+            },
+        }
+
+    def _start_coroutine(self, coroutine):
+        """\
+        Starts the coroutine callback as a task, or queues it, if COROUTINES_LIMIT coroutines are running.
+
+        :param coroutine: coroutine returned by the callback
+        """
+        if self._wakeup is None or self.executor is not None:
+            coroutine.close()
+            raise Exception('Coroutine callbacks can be run only by run_async(), without the executor!')
+        if self.COROUTINES_LIMIT > 0 and self._coroutines_running >= self.COROUTINES_LIMIT:
+            self._coroutines_pending.append(coroutine)
+            return
+        self._coroutines_running += 1
+        get_asyncio().create_task(self._run_coroutine(coroutine))
+
+    async def _run_coroutine(self, coroutine):
+        """\
+        Runs the coroutine callback and then the waiting ones, exceptions are passed to the
+        callback_exception_processors.
+
+        :param coroutine: coroutine returned by the callback
+        """
+        try:
+            while True:
+                try:
+                    await coroutine
+                except Exception as e:
+                    for processor in self.callback_exception_processors:
+                        processor(e)
+                if len(self._coroutines_pending) == 0:
+                    break
+                coroutine = self._coroutines_pending.pop(0)
+        finally:
+            self._coroutines_running -= 1
+
+    def run_callbacks(self, *current_pointer):
+        """\
+        Runs all callbacks for a given pointer.
+
+        Changes of the time table made by the callbacks are rescheduled once, after all callbacks.
+        In the QUEUE_CHANGES mode the changes are also applied after all callbacks,
+        in the order they were made, and their exceptions are passed to the callback_exception_processors.
+
+        :param current_pointer: index 0 -> highest counter
+        """
+        if self._hooks_before_tick:
+            self._call_hooks(self._hooks_before_tick, (self, current_pointer))
+        if not self._hooks_after_tick:
+            self._run_callbacks_batch(current_pointer)
+            return
+        start = ticks_us()
+        self._run_callbacks_batch(current_pointer)
+        self._call_hooks(self._hooks_after_tick, (self, current_pointer, ticks_diff(ticks_us(), start)))
+
+    def _run_callbacks_batch(self, current_pointer):
+        """\
+        Runs all callbacks for a given pointer in one batch, see run_callbacks().
+
+        :param current_pointer: index 0 -> highest counter
+        """
+        # The garbage is collected once, after the callbacks, see SimpleCRON.run_callbacks().
+        with Batch(self, collect_garbage=False):
+            if not self.QUEUE_CHANGES or self._changes_queue is not None:
+                super(SimpleCRONBase, self).run_callbacks(*current_pointer)
+                return
+            self._changes_queue = []
+            try:
+                super(SimpleCRONBase, self).run_callbacks(*current_pointer)
+            finally:
+                changes_queue = self._changes_queue
+                self._changes_queue = None
+                for function, args, kwargs in changes_queue:
+                    try:
+                        function(*args, **kwargs)
+                    except Exception as e:
+                        for processor in self.callback_exception_processors:
+                            processor(e)
+
     def run(self, timer_id=1):
         """
         Initiates a list of tasks and reserves one hardware timer.
@@ -100,7 +735,7 @@ class SimpleCRONBase(SimpleCounter):
         :param timer_id: hardware timer ID
         """
         # One good start up is enough
-        if self.timer is not None:
+        if self.timer is not None or self._wakeup is not None:
             raise Exception('You can run SimpleCRON once.')
         timer = Timer(timer_id)
         # Check if this timer is possible to use
@@ -108,3 +743,79 @@ class SimpleCRONBase(SimpleCounter):
         timer.init(period=1, mode=Timer.ONE_SHOT, callback=lambda t: None)
         self.timer = timer
         self._sync_time()
+
+    async def run_async(self):
+        """
+        Runs the callbacks in the asyncio event loop, instead of the hardware timer.
+
+        It works with uasyncio on MicroPython and with asyncio on Python 3.
+        The coroutine sleeps until the next call, and wakes up earlier if the time table is changed.
+        The time table should be changed only from the event loop, not from interrupts or other threads.
+        Callbacks defined with "async def" are run concurrently, as tasks, see COROUTINES_LIMIT.
+
+        Example:
+        asyncio.create_task(simple_cron.run_async())
+        """
+        asyncio = get_asyncio()
+
+        # One good start up is enough
+        if self.timer is not None or self._wakeup is not None:
+            raise Exception('You can run SimpleCRON once.')
+        wakeup = asyncio.Event()
+        self._wakeup = wakeup
+
+        def set_next_deadline(current_pointer, time_change_pointer):
+            next_time_pointer = self.get_next_pointer(*current_pointer)
+            if next_time_pointer is None:
+                self._set_deadline(None)
+            else:
+                period_seconds = self._get_steps_between(current_pointer, next_time_pointer)
+                period_mili_seconds = self._get_time_change_correction(period_seconds * 1000, time_change_pointer)
+                self._set_deadline((next_time_pointer, ticks_add(time_change_pointer, period_mili_seconds)))
+            return next_time_pointer
+
+        try:
+            self._set_time_change(await self._estimate_time_change_async())
+            # None - the first step, there are no callbacks to run
+            last_time_pointer = None
+            while True:
+                wakeup.clear()
+                if last_time_pointer is not None:
+                    self._start_step(last_time_pointer, self.deadline)
+                current_pointer = self.get_current_pointer()
+                time_change_pointer = self._get_time_change_pointer()
+                next_time_pointer = set_next_deadline(current_pointer, time_change_pointer)
+
+                # Skip callbacks calls when time does not match.
+                is_the_same_callback = next_time_pointer == last_time_pointer and current_pointer != next_time_pointer
+
+                if last_time_pointer is not None and not is_the_same_callback:
+                    self.run_callbacks(*last_time_pointer)
+                    if wakeup.is_set():
+                        # The time table has been changed by the callbacks. The next call is found again from
+                        # the same current pointer, so the call due during the callbacks is not skipped.
+                        wakeup.clear()
+                        next_time_pointer = set_next_deadline(current_pointer, time_change_pointer)
+                last_time_pointer = next_time_pointer
+
+                if next_time_pointer is None:
+                    # There are no tasks, so we wait for a change.
+                    await wakeup.wait()
+                    last_time_pointer = None
+                    continue
+
+                # The time of the callbacks is not counted.
+                period_mili_seconds = ticks_diff(self.deadline[1], self._get_time_change_pointer())
+                if period_mili_seconds > 0:
+                    try:
+                        await asyncio.wait_for(wakeup.wait(), period_mili_seconds / 1000)
+                        # The time table has been changed.
+                        last_time_pointer = None
+                    except asyncio.TimeoutError:
+                        pass
+        finally:
+            self._wakeup = None
+            self.deadline = None
+            for coroutine in self._coroutines_pending:
+                coroutine.close()
+            self._coroutines_pending = []
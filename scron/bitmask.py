@@ -0,0 +1,205 @@
+# Copyright 2019 Wojciech Banaś
+# This code is released under the GPL3 or individual commercial license.
+
+
+def lowest_bit(mask):
+    """\
+    Returns the index of the lowest set bit.
+
+    :param mask: integer, must be greater than 0
+    :return: int
+    """
+    index = 0
+    while not mask & 0xff:
+        mask >>= 8
+        index += 8
+    while not mask & 1:
+        mask >>= 1
+        index += 1
+    return index
+
+
+def next_bit(mask, start):
+    """\
+    Returns the index of the lowest set bit that is greater than or equal to "start".
+
+    :param mask: integer
+    :param start: first bit to check
+    :return: int or -1 if there is no such bit
+    """
+    mask >>= start
+    if not mask:
+        return -1
+    return start + lowest_bit(mask)
+
+
+class BitmaskTimeTable:
+    """\
+    Time table storage engine, which keeps each counter level as an integer bitmask.
+
+    Callbacks with the same schedule are kept in one group:
+    groups = {(<mask highest counter>, ..., <mask lowest counter>): {<callback_name>, ...}, ...}
+
+    Usage:
+    SimpleCRON(time_table_engine=BitmaskTimeTable)
+    """
+
+    # Whether SimpleCRON can keep the compiled index of this time table, see COMPILED_INDEX_MAX_SIZE.
+    COMPILED_INDEX = True
+
+    def __init__(self, time_table_limits, wildcard_value):
+        """\
+        :param time_table_limits: list of maximum values for each counter, index 0 -> highest counter
+        :param wildcard_value: value which means "every value of the counter"
+        """
+        self.time_table_limits = time_table_limits
+        self.wildcard_value = wildcard_value
+        self.full_masks = [(1 << (limit + 1)) - 1 for limit in time_table_limits]
+        # groups = {<masks>: {<callback_name>, ...}, ...}
+        self.groups = {}
+        # callbacks_groups = {<callback_name>: [<masks>, ...], ...}
+        self.callbacks_groups = {}
+
+    def _get_masks(self, time_steps_validated):
+        masks = []
+        for level, values in enumerate(time_steps_validated):
+            if values[0] == self.wildcard_value:
+                masks.append(self.full_masks[level])
+            else:
+                mask = 0
+                for value in values:
+                    mask |= 1 << value
+                masks.append(mask)
+        return tuple(masks)
+
+    def _get_values(self, level, mask):
+        if mask == self.full_masks[level]:
+            return [self.wildcard_value]
+        return [value for value in range(self.time_table_limits[level] + 1) if mask & (1 << value)]
+
+    # Group access, a group is identified by the masks.
+
+    def _get_groups(self):
+        return self.groups
+
+    def _get_group_masks(self, group):
+        return group
+
+    def _get_group_callbacks(self, group):
+        return self.groups[group]
+
+    def _get_group_next_value(self, group, level, start):
+        """\
+        Returns the lowest value of the counter level in the group, that is greater than or equal to "start".
+
+        :return: int or -1 if there is no such value
+        """
+        return next_bit(group[level], start)
+
+    def _get_next_group_pointer(self, group, nearest_time_pointer):
+        """\
+        Returns the nearest pointer of the group.
+
+        :return: tuple(<next cycle: boolean>, <pointer>)
+        """
+        max_level = len(self.time_table_limits)
+        pointer = list(nearest_time_pointer)
+        level = 0
+        while level < max_level:
+            value = self._get_group_next_value(group, level, pointer[level])
+            if value == pointer[level]:
+                level += 1
+                continue
+            if value >= 0:
+                pointer[level] = value
+                for lower_level in range(level + 1, max_level):
+                    pointer[lower_level] = self._get_group_next_value(group, lower_level, 0)
+                return False, tuple(pointer)
+            if level == 0:
+                # The nearest call will be in the next counter cycle.
+                return True, tuple(self._get_group_next_value(group, level, 0) for level in range(max_level))
+            # Carry to the higher counter.
+            level -= 1
+            pointer[level] += 1
+            for lower_level in range(level + 1, max_level):
+                pointer[lower_level] = 0
+        return False, tuple(pointer)
+
+    def add(self, callback_name, time_steps_validated):
+        """\
+        Adds the callback to the group with the given schedule.
+
+        :param callback_name: callback name ID
+        :param time_steps_validated: list of lists of integers, index 0 -> highest counter
+        """
+        masks = self._get_masks(time_steps_validated)
+        if masks in self.groups:
+            self.groups[masks].add(callback_name)
+        else:
+            self.groups[masks] = {callback_name}
+        callback_groups = self.callbacks_groups.setdefault(callback_name, [])
+        if masks not in callback_groups:
+            callback_groups.append(masks)
+
+    def remove(self, callback_name):
+        """\
+        Removes the callback from all groups.
+
+        :param callback_name: callback name ID
+        """
+        for masks in self.callbacks_groups.pop(callback_name, ()):
+            group = self.groups[masks]
+            group.discard(callback_name)
+            if len(group) == 0:
+                del self.groups[masks]
+
+    def get_callbacks(self, pointer):
+        """\
+        Returns the generator of callback names, which should be run for the given pointer.
+
+        A callback with many schedules can be returned more than once.
+
+        :param pointer: index 0 -> highest counter
+        """
+        for group in self._get_groups():
+            for level, value in enumerate(pointer):
+                if self._get_group_next_value(group, level, value) != value:
+                    break
+            else:
+                yield from self._get_group_callbacks(group)
+
+    def get_next_pointer(self, nearest_time_pointer):
+        """\
+        Returns the first pointer that is equal to or greater than the nearest time pointer.
+
+        :param nearest_time_pointer: index 0 -> highest counter
+        :return: tuple(<highest counter pointer>, ...) or None
+        """
+        out_value = None
+        for group in self._get_groups():
+            value = self._get_next_group_pointer(group, nearest_time_pointer)
+            if out_value is None or value < out_value:
+                out_value = value
+        if out_value is None:
+            return None
+        return out_value[1]
+
+    def list(self):
+        """\
+        Returns the generator containing full and ordered information about all steps.
+
+        :return: (<highest counter pointer>, ..., {<callback_name>, ...})
+        """
+        steps = {}
+        for group in self._get_groups():
+            callback_names = self._get_group_callbacks(group)
+            pointers = [()]
+            for level, mask in enumerate(self._get_group_masks(group)):
+                pointers = [pointer + (value,) for pointer in pointers for value in self._get_values(level, mask)]
+            for pointer in pointers:
+                if pointer in steps:
+                    steps[pointer] = steps[pointer].union(callback_names)
+                else:
+                    steps[pointer] = set(callback_names)
+        for pointer in sorted(steps):
+            yield pointer + (steps[pointer],)
@@ -0,0 +1,126 @@
+# Copyright 2019 Wojciech Banaś
+# This code is released under the GPL3 or individual commercial license.
+
+from scron.bitmask import BitmaskTimeTable, lowest_bit
+
+
+class CompactTimeTable(BitmaskTimeTable):
+    """\
+    Time table storage engine for boards with little RAM.
+
+    Each schedule of a callback is one fixed-size record in a single bytearray:
+    <callback ID: 2 bytes><bitmap highest counter>...<bitmap lowest counter>
+
+    For SimpleCRON a record takes 22 bytes (2 + 1 + 3 + 8 + 8).
+    Callback names are replaced with small integer IDs.
+
+    Usage:
+    SimpleCRON(time_table_engine=CompactTimeTable)
+    """
+
+    # The compiled index needs much more RAM than the records, so the next call is searched in the records.
+    COMPILED_INDEX = False
+
+    def __init__(self, time_table_limits, wildcard_value):
+        super(CompactTimeTable, self).__init__(time_table_limits, wildcard_value)
+        # The record offset of each counter bitmap.
+        self.levels_offsets = []
+        offset = 2
+        for limit in time_table_limits:
+            self.levels_offsets.append(offset)
+            offset += (limit + 8) // 8
+        self.record_size = offset
+        # The bytearray is only extended, removed records are overwritten by the last record.
+        self.records = bytearray()
+        self.records_count = 0
+        # names = [<callback_name> or None, ...], index -> callback ID
+        self.names = []
+        # ids = {<callback_name>: <callback ID>, ...}
+        self.ids = {}
+
+    # Group access, a group is identified by the record offset.
+
+    def _get_groups(self):
+        return range(0, self.records_count * self.record_size, self.record_size)
+
+    def _get_group_id(self, group):
+        return self.records[group] | (self.records[group + 1] << 8)
+
+    def _get_group_masks(self, group):
+        masks = []
+        for level, level_offset in enumerate(self.levels_offsets):
+            mask = 0
+            for byte_index in range((self.time_table_limits[level] + 8) // 8):
+                mask |= self.records[group + level_offset + byte_index] << (byte_index * 8)
+            masks.append(mask)
+        return masks
+
+    def _get_group_callbacks(self, group):
+        return (self.names[self._get_group_id(group)],)
+
+    def _get_group_next_value(self, group, level, start):
+        offset = group + self.levels_offsets[level]
+        limit = self.time_table_limits[level]
+        records = self.records
+        value = start
+        while value <= limit:
+            byte = records[offset + (value >> 3)] >> (value & 7)
+            if byte:
+                return value + lowest_bit(byte)
+            value = (value | 7) + 1
+        return -1
+
+    def add(self, callback_name, time_steps_validated):
+        """\
+        Adds a record with the schedule of the callback.
+
+        :param callback_name: callback name ID
+        :param time_steps_validated: list of lists of integers, index 0 -> highest counter
+        """
+        if callback_name in self.ids:
+            callback_id = self.ids[callback_name]
+        else:
+            try:
+                callback_id = self.names.index(None)
+                self.names[callback_id] = callback_name
+            except ValueError:
+                callback_id = len(self.names)
+                self.names.append(callback_name)
+            self.ids[callback_name] = callback_id
+
+        masks = self._get_masks(time_steps_validated)
+        for group in self._get_groups():
+            if self._get_group_id(group) == callback_id and self._get_group_masks(group) == list(masks):
+                return
+
+        group = self.records_count * self.record_size
+        if len(self.records) < group + self.record_size:
+            self.records.extend(bytes(self.record_size))
+        self.records_count += 1
+        self.records[group] = callback_id & 0xff
+        self.records[group + 1] = callback_id >> 8
+        for level, mask in enumerate(masks):
+            offset = group + self.levels_offsets[level]
+            for byte_index in range((self.time_table_limits[level] + 8) // 8):
+                self.records[offset + byte_index] = (mask >> (byte_index * 8)) & 0xff
+
+    def remove(self, callback_name):
+        """\
+        Removes all records of the callback.
+
+        :param callback_name: callback name ID
+        """
+        if callback_name not in self.ids:
+            return
+        callback_id = self.ids.pop(callback_name)
+        self.names[callback_id] = None
+        group = 0
+        while group < self.records_count * self.record_size:
+            if self._get_group_id(group) == callback_id:
+                # The last record is moved in place of the removed one.
+                self.records_count -= 1
+                last_group = self.records_count * self.record_size
+                for byte_index in range(self.record_size):
+                    self.records[group + byte_index] = self.records[last_group + byte_index]
+            else:
+                group += self.record_size
@@ -354,10 +354,9 @@ class SimpleCRON():
             else:
                 if (level - 1) == -1:
                     return get_first(time_table_base)
-                if next_time_pointer[level - 1] == list(self.TIME_TABLE_KEYS.values())[level - 1]:
-                    next_time_pointer[level - 1] = 0
-                else:
-                    next_time_pointer[level - 1] = next_time_pointer[level - 1] + 1
+                # Carry to the higher counter. A value above the maximum does not match any key,
+                # so the carry goes on to the next higher counter.
+                next_time_pointer[level - 1] = next_time_pointer[level - 1] + 1
                 next_time_pointer[level:] = [0] * len(next_time_pointer[level:])
                 out_value = out_value[:-1]
                 level -= 1
@@ -1,6 +1,12 @@
 # Copyright 2019 Wojciech Banaś
 # This code is released under the GPL3 or individual commercial license.
 
+try:
+    import _thread
+except ImportError:
+    _thread = None
+
+
 def run_times(times):
     """
     The decorator determines how many times the given callback can be started.
@@ -112,10 +118,184 @@ class time_since_last_call:
         return self.callback(scorn_instance, callback_name, pointer, memory)
 
 
+class overrun:
+    """
+    Decorator determines what happens with a call, which starts while the previous call of the callback
+    is still running (e.g. a job every 2 seconds takes 20 seconds).
+
+    The calls can overlap if the callbacks are run by the executor, or if the callback is a coroutine
+    run by run_async().
+
+    Policies:
+
+    * overrun.SKIP - the call is skipped,
+    * overrun.COALESCE - the missed calls are coalesced into one call, which is started after the running one,
+      with the pointer of the last missed call,
+    * overrun.QUEUE - up to "queue_size" calls wait and are started one by one after the running one,
+      the next calls are skipped,
+    * overrun.CONCURRENT - the calls run at the same time.
+
+    Counters:
+
+    * memory[overrun.RUNNING_ID] - number of the running calls,
+    * memory[overrun.SKIPPED_ID] - number of the skipped calls,
+    * memory[overrun.COALESCED_ID] - number of the calls coalesced into another call.
+
+    Usage:
+
+    @overrun(overrun.SKIP)
+    def callback(scorn_instance, callback_name, pointer, memory):
+        ...
+
+    :param policy: overrun.SKIP | overrun.COALESCE | overrun.QUEUE | overrun.CONCURRENT
+    :param queue_size: maximum number of the waiting calls, used by the overrun.QUEUE policy
+    :return:
+    """
+    SKIP = 'skip'
+    COALESCE = 'coalesce'
+    QUEUE = 'queue'
+    CONCURRENT = 'concurrent'
+
+    RUNNING_ID = '__overrun_running'
+    SKIPPED_ID = '__overrun_skipped'
+    COALESCED_ID = '__overrun_coalesced'
+    # List of the pointers of the waiting calls.
+    PENDING_ID = '__overrun_pending'
+
+    def __init__(self, policy, queue_size=1):
+        if policy not in (overrun.SKIP, overrun.COALESCE, overrun.QUEUE, overrun.CONCURRENT):
+            raise Exception('Unknown overrun policy: %s' % policy)
+        if queue_size < 1:
+            raise Exception('The queue size must be greater than 0')
+        self.policy = policy
+        self.queue_size = queue_size
+        # The calls can be started by many threads of the executor at the same time.
+        self.lock = _thread.allocate_lock() if _thread is not None else None
+
+    def __call__(self, callback):
+        def wrapper(scorn_instance, callback_name, pointer, memory):
+            if not self._start(pointer, memory):
+                return None
+            error = None
+            while True:
+                try:
+                    out = callback(scorn_instance, callback_name, pointer, memory)
+                except Exception as e:
+                    error = e
+                    out = None
+                if out is not None and hasattr(out, 'send'):
+                    # The coroutine is running until it is finished by the event loop.
+                    return self._run_coroutine(callback, out, scorn_instance, callback_name, memory)
+                pointer = self._next(memory)
+                if pointer is None:
+                    if error is not None:
+                        raise error
+                    return out
+                if error is not None:
+                    self._report_error(scorn_instance, error)
+                    error = None
+
+        return wrapper
+
+    def _start(self, pointer, memory):
+        """\
+        Registers the start of the call.
+
+        :param pointer: pointer of the call
+        :param memory: memory of the callback
+        :return: boolean, False if the call has been skipped or is waiting for the running call
+        """
+        if self.lock is not None:
+            self.lock.acquire()
+        try:
+            if overrun.RUNNING_ID not in memory:
+                memory[overrun.RUNNING_ID] = 0
+                memory[overrun.SKIPPED_ID] = 0
+                memory[overrun.COALESCED_ID] = 0
+                memory[overrun.PENDING_ID] = []
+            if memory[overrun.RUNNING_ID] == 0 or self.policy == overrun.CONCURRENT:
+                memory[overrun.RUNNING_ID] += 1
+                return True
+            pending = memory[overrun.PENDING_ID]
+            if self.policy == overrun.SKIP:
+                memory[overrun.SKIPPED_ID] += 1
+            elif self.policy == overrun.COALESCE:
+                if len(pending) > 0:
+                    pending[0] = pointer
+                    memory[overrun.COALESCED_ID] += 1
+                else:
+                    pending.append(pointer)
+            elif len(pending) < self.queue_size:
+                pending.append(pointer)
+            else:
+                memory[overrun.SKIPPED_ID] += 1
+            return False
+        finally:
+            if self.lock is not None:
+                self.lock.release()
+
+    def _next(self, memory):
+        """\
+        Registers the end of the call.
+
+        :param memory: memory of the callback
+        :return: pointer of the waiting call, which should be started now, or None
+        """
+        if self.lock is not None:
+            self.lock.acquire()
+        try:
+            pending = memory[overrun.PENDING_ID]
+            if len(pending) > 0:
+                return pending.pop(0)
+            memory[overrun.RUNNING_ID] -= 1
+            return None
+        finally:
+            if self.lock is not None:
+                self.lock.release()
+
+    def _report_error(self, scorn_instance, error):
+        """\
+        Passes the exception of the call to the callback_exception_processors, before the waiting call is started.
+
+        The exception of the last call is raised, so each exception is reported once.
+
+        :param scorn_instance: SimpleCRON instance
+        :param error: exception of the call
+        """
+        for processor in scorn_instance.callback_exception_processors:
+            processor(error)
+
+    async def _run_coroutine(self, callback, coroutine, scorn_instance, callback_name, memory):
+        error = None
+        while True:
+            try:
+                if coroutine is not None:
+                    await coroutine
+            except Exception as e:
+                error = e
+            pointer = self._next(memory)
+            if pointer is None:
+                break
+            if error is not None:
+                self._report_error(scorn_instance, error)
+                error = None
+            coroutine = None
+            try:
+                out = callback(scorn_instance, callback_name, pointer, memory)
+                if out is not None and hasattr(out, 'send'):
+                    coroutine = out
+            except Exception as e:
+                error = e
+        if error is not None:
+            raise error
+
+
 def debug_call(callback):
     """
     The decorator displays information about the current call
 
+    Printing changes the timing of the calls, to trace a busy schedule use scron.trace.Trace.
+
     :param callback:
     :return:
     """
@@ -0,0 +1,119 @@
+# Copyright 2019 Wojciech Banaś
+# This code is released under the GPL3 or individual commercial license.
+
+import _thread
+
+
+class ThreadPoolExecutor:
+    """\
+    Bounded pool of worker threads, which run the callbacks outside of the timer callback.
+
+    The timer callback only puts the callbacks into the queue, so a long callback does not delay the next calls.
+    If the queue is full, then the callback is skipped, and the exception is passed to the
+    callback_exception_processors.
+
+    Usage:
+    SimpleCRON(executor=ThreadPoolExecutor(workers=2))
+    """
+
+    def __init__(self, workers=2, queue_size=16):
+        """\
+        :param workers: number of worker threads
+        :param queue_size: maximum number of callbacks waiting for a worker
+        """
+        self.workers = workers
+        self.queue_size = queue_size
+        # queue = [(<function>, <args>), ...]
+        self.queue = []
+        # The lock of the queue, the wake locks and the counters.
+        self.lock = _thread.allocate_lock()
+        # Wake locks of the idle workers, each worker waits on its own lock until a job is submitted.
+        self.idle = []
+        self.running = True
+        # Counters, see stats()
+        self.busy = 0
+        self.max_queue_depth = 0
+        self.submitted = 0
+        self.completed = 0
+        self.rejected = 0
+        self.errors = 0
+        for worker in range(workers):
+            _thread.start_new_thread(self._worker, ())
+
+    def _worker(self):
+        wake = _thread.allocate_lock()
+        wake.acquire()
+        while True:
+            with self.lock:
+                if not self.running:
+                    return
+                if len(self.queue) > 0:
+                    function, args = self.queue.pop(0)
+                    self.busy += 1
+                else:
+                    function = None
+                    self.idle.append(wake)
+            if function is None:
+                # Sleeping until submit() or shutdown() releases the wake lock.
+                wake.acquire()
+                continue
+            try:
+                function(*args)
+            except Exception:
+                with self.lock:
+                    self.errors += 1
+            with self.lock:
+                self.busy -= 1
+                self.completed += 1
+
+    def submit(self, function, *args):
+        """\
+        Puts the function into the queue of the workers.
+
+        :param function: function(*args)
+        :return: boolean, False if the queue is full and the function has been rejected
+        """
+        with self.lock:
+            if not self.running or len(self.queue) >= self.queue_size:
+                self.rejected += 1
+                return False
+            self.queue.append((function, args))
+            self.submitted += 1
+            if len(self.queue) > self.max_queue_depth:
+                self.max_queue_depth = len(self.queue)
+            wake = self.idle.pop() if len(self.idle) > 0 else None
+        if wake is not None:
+            wake.release()
+        return True
+
+    def shutdown(self):
+        """\
+        Stops the workers after their current jobs, the queued jobs are not run.
+        """
+        with self.lock:
+            self.running = False
+            self.queue = []
+            idle = self.idle
+            self.idle = []
+        for wake in idle:
+            wake.release()
+
+    def stats(self):
+        """\
+        Returns the statistics of the pool.
+
+        :return: dict(workers=<number of workers>, busy=<busy workers>, queue_depth=<waiting jobs>,
+            max_queue_depth=<the highest queue_depth>, submitted=<jobs>, completed=<jobs>,
+            rejected=<jobs, queue was full>, errors=<jobs, raised exception>)
+        """
+        with self.lock:
+            return {
+                'workers': self.workers,
+                'busy': self.busy,
+                'queue_depth': len(self.queue),
+                'max_queue_depth': self.max_queue_depth,
+                'submitted': self.submitted,
+                'completed': self.completed,
+                'rejected': self.rejected,
+                'errors': self.errors,
+            }
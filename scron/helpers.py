@@ -7,6 +7,23 @@ except:
     # micropython Unix port
     from time import mktime
 
+try:
+    from array import array
+except ImportError:
+    from uarray import array
+
+try:
+    import _thread
+except ImportError:
+    # Port without threads
+    _thread = None
+
+try:
+    from micropython import schedule
+except ImportError:
+    # Python 3
+    schedule = None
+
 try:
     from collections import OrderedDict
 
@@ -45,6 +62,108 @@ except ImportError:
         return '%s({%s})' % (dictionary.__class__.__name__, ', '.join(out_values))
 
 
+def bisect_left(values, value):
+    """\
+    Returns the index where to insert "value" in the sorted "values", to keep it sorted.
+
+    If "value" is already present, then the index points before the leftmost one.
+
+    :param values: sorted list or array
+    :param value: value to find
+    :return: int
+    """
+    low = 0
+    high = len(values)
+    while low < high:
+        middle = (low + high) // 2
+        if values[middle] < value:
+            low = middle + 1
+        else:
+            high = middle
+    return low
+
+
+class SortedDict:
+    """\
+    Dictionary which keeps its keys sorted.
+
+    A new key is inserted in its place with a binary search, so the dictionary is never rebuilt or re-sorted.
+    """
+
+    def __init__(self, items=()):
+        self._keys = []
+        self._values = {}
+        for key, value in items:
+            self[key] = value
+
+    def __contains__(self, key):
+        return key in self._values
+
+    def __getitem__(self, key):
+        return self._values[key]
+
+    def __setitem__(self, key, value):
+        if key not in self._values:
+            self._keys.insert(bisect_left(self._keys, key), key)
+        self._values[key] = value
+
+    def __delitem__(self, key):
+        del self._values[key]
+        self._keys.pop(bisect_left(self._keys, key))
+
+    def __iter__(self):
+        return iter(self._keys)
+
+    def __len__(self):
+        return len(self._keys)
+
+    def clear(self):
+        self._keys = []
+        self._values = {}
+
+    def copy(self):
+        """\
+        Returns a shallow copy of the dictionary.
+
+        :return: SortedDict
+        """
+        out = SortedDict()
+        out._keys = self._keys[:]
+        out._values = self._values.copy()
+        return out
+
+    def get(self, key, default=None):
+        return self._values.get(key, default)
+
+    def keys(self):
+        return iter(self._keys)
+
+    def values(self):
+        for key in self._keys:
+            yield self._values[key]
+
+    def items(self):
+        for key in self._keys:
+            yield key, self._values[key]
+
+    def __eq__(self, other):
+        try:
+            if len(self) != len(other):
+                return False
+            for key, value in self.items():
+                if key not in other or other[key] != value:
+                    return False
+        except TypeError:
+            return False
+        return True
+
+    def __ne__(self, other):
+        return not self.__eq__(other)
+
+    def __repr__(self):
+        return repr_dict(self)
+
+
 def merge_tree(tree_a, tree_b):
     """\
     It connects two OrderDict trees into one.
@@ -73,10 +192,109 @@ def merge_tree(tree_a, tree_b):
     return out
 
 
+class MergedTree:
+    """\
+    Lazy view of merged trees, the trees are not copied.
+
+    Keys are merged in order, on demand, so reading stops at the first needed key.
+    Branches are merged only when they are read. At the end of the branches, there must be objects of "set".
+    """
+
+    def __init__(self, *trees):
+        self.trees = trees
+
+    def _is_leaf(self):
+        tree = self.trees[0]
+        # Merged leaves can be merged again.
+        while type(tree) is MergedTree:
+            tree = tree.trees[0]
+        return type(tree) is set
+
+    def __contains__(self, key):
+        for tree in self.trees:
+            if key in tree:
+                return True
+        return False
+
+    def __getitem__(self, key):
+        branches = [tree[key] for tree in self.trees if key in tree]
+        if len(branches) == 0:
+            raise KeyError(key)
+        if len(branches) == 1:
+            return branches[0]
+        return MergedTree(*branches)
+
+    def __iter__(self):
+        if self._is_leaf():
+            # Union of the sets.
+            for tree_key, tree in enumerate(self.trees):
+                for value in tree:
+                    for previous_tree in self.trees[:tree_key]:
+                        if value in previous_tree:
+                            break
+                    else:
+                        yield value
+        else:
+            yield from self.keys()
+
+    def __len__(self):
+        length = 0
+        for value in self:
+            length += 1
+        return length
+
+    def keys(self):
+        # [[<current key>, <keys iterator>], ...]
+        heads = []
+        for tree in self.trees:
+            keys_iterator = iter(tree.keys())
+            for key in keys_iterator:
+                heads.append([key, keys_iterator])
+                break
+        while len(heads) > 0:
+            key = heads[0][0]
+            for head in heads:
+                if head[0] < key:
+                    key = head[0]
+            yield key
+            for head_key in range(len(heads) - 1, -1, -1):
+                head = heads[head_key]
+                if head[0] == key:
+                    try:
+                        head[0] = next(head[1])
+                    except StopIteration:
+                        del heads[head_key]
+
+    def values(self):
+        for key in self.keys():
+            yield self[key]
+
+    def items(self):
+        for key in self.keys():
+            yield key, self[key]
+
+    def __eq__(self, other):
+        if self._is_leaf():
+            return set(self) == other
+        try:
+            assert_dict(other, self)
+        except AssertionError as e:
+            return False
+        return True
+
+    def __ne__(self, other):
+        return not self.__eq__(other)
+
+    def __repr__(self):
+        if self._is_leaf():
+            return repr(set(self))
+        return repr_dict(self)
+
+
 class CounterDict:
     WILDCARD_VALUE = -1
 
-    def __init__(self, count_table, count_table_limits):
+    def __init__(self, count_table, count_table_limits, merge_cache=None):
         """\
         Tree decorator. Expands the input tree "count_table" into the expected structure/tree.
 
@@ -101,30 +319,54 @@ class CounterDict:
 
         :param count_table: OrderDict
         :param count_table_limits: list
+        :param merge_cache: dictionary shared by the whole tree, which memoizes the last merged branch of each level,
+            so its size is limited by the nesting level while the counter goes on.
+            After each change of "count_table" a new dictionary must be used.
         """
         self.count_table = count_table
         self.count_table_limits = count_table_limits
-        if len(list(self.keys())) > 0:
+        self.merge_cache = merge_cache
+        # The merged trees consist of the branches, which have already been checked.
+        if type(count_table) is not MergedTree and len(list(self.keys())) > 0:
             if max(self.keys()) > count_table_limits[0]:
                 raise KeyError('Keys can have a maximum value of %d' % count_table_limits[0])
 
-    def items(self):
-        def get_value(key, value):
-            if type(value) is OrderedDict:
-                yield key, CounterDict(value, self.count_table_limits[1:])
-            else:
-                yield key, value
+    def _get_value(self, key):
+        """\
+        Returns the branch for the key, merged with the wildcard branch.
+
+        :param key: int
+        :return: CounterDict, set or MergedTree of sets
+        """
+        merge_cache = self.merge_cache
+        level = len(self.count_table_limits)
+        if merge_cache is not None:
+            # merge_cache = {<level>: (<count_table>, <key>, <merged branch>), ...}
+            cached = merge_cache.get(level)
+            if cached is not None and cached[0] is self.count_table and cached[1] == key:
+                return cached[2]
 
         if self.WILDCARD_VALUE in self.count_table:
-            for key in range(0, self.count_table_limits[0] + 1):
-                if key in self.count_table:
-                    value_combined = merge_tree(self.count_table[key], self.count_table[self.WILDCARD_VALUE])
-                    yield from get_value(key, value_combined)
-                else:
-                    yield from get_value(key, self.count_table[self.WILDCARD_VALUE])
+            if key in self.count_table:
+                value = MergedTree(self.count_table[key], self.count_table[self.WILDCARD_VALUE])
+            else:
+                value = self.count_table[self.WILDCARD_VALUE]
         else:
-            for key, value in self.count_table.items():
-                yield from get_value(key, value)
+            value = self.count_table[key]
+        if level > 1:
+            # It is not a leaf.
+            value = CounterDict(value, self.count_table_limits[1:], merge_cache)
+
+        if merge_cache is not None:
+            merge_cache[level] = (self.count_table, key, value)
+        return value
+
+    def __getitem__(self, key):
+        return self._get_value(key)
+
+    def items(self):
+        for key in self.keys():
+            yield key, self._get_value(key)
 
     def keys(self):
         if self.WILDCARD_VALUE in self.count_table:
@@ -133,22 +375,8 @@ class CounterDict:
             return self.count_table.keys()
 
     def values(self):
-        def get_value(value):
-            if type(value) is OrderedDict:
-                yield CounterDict(value, self.count_table_limits[1:])
-            else:
-                yield value
-
-        if self.WILDCARD_VALUE in self.count_table:
-            for key in range(0, self.count_table_limits[0] + 1):
-                if key in self.count_table:
-                    value_combined = merge_tree(self.count_table[key], self.count_table[self.WILDCARD_VALUE])
-                    yield from get_value(value_combined)
-                else:
-                    yield from get_value(self.count_table[self.WILDCARD_VALUE])
-        else:
-            for key, value in self.count_table.items():
-                yield from get_value(value)
+        for key in self.keys():
+            yield self._get_value(key)
 
     def __delattr__(self, item):
         pass
@@ -167,3 +395,81 @@ class CounterDict:
 
     def __repr__(self):
         return repr_dict(self)
+
+
+class RWLock:
+    """\
+    Lock of the changes of the time table.
+
+    Readers wait for the writer of another thread (_thread module) on a real lock, without a busy wait.
+    The writer of the same thread can only be interrupted by the timer callback, which cannot wait for it,
+    so the work of the callback is deferred until the lock is released.
+    """
+
+    def __init__(self):
+        self.lock = None if _thread is None else _thread.allocate_lock()
+        self.locked = False
+        # The thread ID of the writer.
+        self.owner = None
+        # deferred = [(<function>, <argument>), ...]
+        self.deferred = []
+
+    def _is_owner(self):
+        return self.lock is None or self.owner == _thread.get_ident()
+
+    def acquire(self):
+        if self.locked and self._is_owner():
+            raise Exception('The time table is already being changed by the interrupted code!')
+        if self.lock is not None:
+            self.lock.acquire()
+            self.owner = _thread.get_ident()
+        self.locked = True
+
+    def release(self):
+        self.locked = False
+        self.owner = None
+        if self.lock is not None:
+            self.lock.release()
+        deferred = self.deferred
+        while deferred:
+            function, argument = deferred.pop(0)
+            if schedule is None:
+                function(argument)
+            else:
+                try:
+                    schedule(function, argument)
+                except RuntimeError:
+                    # The queue of scheduled functions is full.
+                    function(argument)
+
+    def interrupted(self):
+        """\
+        Returns whether the changes are made by the interrupted code of the current thread.
+
+        :return: boolean
+        """
+        return self.locked and self._is_owner()
+
+    def wait(self):
+        """\
+        Waits for the end of the changes made by another thread.
+
+        :return: False if the changes are made by the interrupted code of the current thread,
+            then the waiting is not possible
+        """
+        if not self.locked:
+            return True
+        if self._is_owner():
+            return False
+        self.lock.acquire()
+        self.lock.release()
+        return True
+
+    def defer(self, function, argument):
+        """\
+        Runs function(argument) after the lock is released, with micropython.schedule() if available.
+
+        :param function: function(argument)
+        :param argument: any object
+        """
+        self.deferred.append((function, argument))
@@ -1,12 +1,11 @@
 # Copyright 2019 Wojciech Banaś
 # This code is released under the GPL3 or individual commercial license.
 
-from scron.helpers import OrderedDict, CounterDict
+from scron.helpers import OrderedDict, SortedDict, CounterDict, RWLock, array, bisect_left
 
 
 class SimpleCounter():
     WILDCARD_VALUE = -1
-    _lock_rw = False
 
     # The dictionary contains a description of all the fields counter.
     # The order is important!!!
@@ -23,12 +22,39 @@ class SimpleCounter():
     # processor_exception_function(exception_instance)
     callback_exception_processors = [lambda e: print('Callback EXCEPTION: %s' % e)]
 
-    def __init__(self):
-        self.time_table = OrderedDict()
+    # The maximum number of call instants in the compiled index of the time table.
+    # With more call instants, the next pointer is searched directly in the time table.
+    # 0 - the compiled index is disabled, it is also disabled by the engines with COMPILED_INDEX = False.
+    COMPILED_INDEX_MAX_SIZE = 1024
+
+    def __init__(self, time_table_engine=None, executor=None):
+        """\
+        :param time_table_engine: alternative storage engine class for the time table,
+            eg. scron.bitmask.BitmaskTimeTable, default: SortedDict tree in self.time_table
+        :param executor: runs the callbacks outside of the timer callback,
+            eg. scron.executor.ThreadPoolExecutor(), default: the callbacks are run at once
+        """
+        self.time_table = SortedDict()
         # callbacks = {<callback_name>: <callback>, ...}
         self.callbacks = {}
         # callbacks_memory = {<callback_name>: {}, ...}
         self.callbacks_memory = {}
+        # Reverse index of the SortedDict tree, the leaves of the callback are generated from its time steps.
+        # _callbacks_time_steps = {<callback_name>: [<validated time steps>, ...], ...}
+        self._callbacks_time_steps = {}
+        # The generation is changed after each change of the time table.
+        self._generation = 0
+        # _compiled_index = (<generation>, <sorted array of call instants> or None, <array of groups ids>, <groups>)
+        self._compiled_index = None
+        # _merged_time_table = (<generation>, <CounterDict with the last merges of wildcard branches memoized>)
+        self._merged_time_table = None
+        # Lock of the changes of the time table.
+        self._lock_rw = RWLock()
+        self.executor = executor
+        if time_table_engine is None:
+            self.time_table_engine = None
+        else:
+            self.time_table_engine = time_table_engine(list(self.TIME_TABLE_KEYS.values()), self.WILDCARD_VALUE)
 
     # #####################
     # SCOUNT - START
@@ -108,43 +134,243 @@ class SimpleCounter():
         nearest_time_pointer = list(reversed(nearest_time_pointer))
         return nearest_time_pointer
 
-    def _wait_for_unlock_rw(self):
+    def _pointer_to_index(self, pointer):
         """\
-        Returns the current pointer for the counter.
+        Converts the pointer to the number of the smallest steps since the beginning of the counter cycle.
+
+        For SimpleCRON it is the second of the week.
+
+        :param pointer: index 0 -> highest counter
+        :return: int
         """
-        raise NotImplementedError()
+        index = 0
+        for value, time_max_digit in zip(pointer, self.TIME_TABLE_KEYS.values()):
+            index = index * (time_max_digit + 1) + value
+        return index
 
-    # SCOUNT - END
-    # #####################
+    def _index_to_pointer(self, index):
+        """\
+        Converts the number of the smallest steps since the beginning of the counter cycle to the pointer.
 
-    def add(self, callback_name, callback, *time_steps, removable=True):
+        :param index: int
+        :return: tuple(<highest counter pointer>, ...)
+        """
+        pointer = []
+        for time_max_digit in reversed(list(self.TIME_TABLE_KEYS.values())):
+            index, value = divmod(index, time_max_digit + 1)
+            pointer.append(value)
+        return tuple(reversed(pointer))
+
+    def _get_cycle_size(self):
         """\
-        Adds an entry to the current queue.
+        Returns the number of the smallest steps in one counter cycle.
 
-        :param callback_name: callback name ID
-        :param callback: callable(<SimpleCRON_instance>, <callback_name>, <current_pointer>)
-        :param time_steps: list counters steps, eg. [[2,5], 3, 1, [2,3,4]], index 0 -> highest counter
-        :param removable: boolean if false, then the entry cannot normally be deleted
-        :return: None
+        For SimpleCRON it is the number of seconds in a week.
+
+        :return: int
         """
-        self._wait_for_unlock_rw()
+        return self._pointer_to_index(self.TIME_TABLE_KEYS.values()) + 1
 
-        if not callable(callback):
-            raise TypeError("Callback object isn't callable")
+    def _get_steps_between(self, pointer_from, pointer_to):
+        """\
+        Returns the number of the smallest steps from one pointer to the next occurrence of the other pointer.
 
-        time_steps_validated = []
-        for time_step_key, (time_table_key, time_table_value) in enumerate(self.TIME_TABLE_KEYS.items()):
-            time_steps_validated.append(
-                self._validate_input(
-                    time_table_key,
-                    time_steps[time_step_key],
-                    time_table_value
-                )
-            )
+        :param pointer_from: index 0 -> highest counter
+        :param pointer_to: index 0 -> highest counter
+        :return: int, from 1 to the size of the counter cycle
+        """
+        cycle_size = self._get_cycle_size()
+        steps = (self._pointer_to_index(pointer_to) - self._pointer_to_index(pointer_from)) % cycle_size
+        if steps == 0:
+            return cycle_size
+        return steps
+
+    def _compile(self):
+        """\
+        Compiles the time table into a sorted array of call instants.
+
+        :return: tuple(<sorted array of call instants>, <array of groups ids>, <groups>) or (None, None, None)
+            if the time table has more than COMPILED_INDEX_MAX_SIZE call instants.
+            groups = [((<callback_name>, <callback>, <memory>), ...), ...]
+        """
+        time_max_digits = list(self.TIME_TABLE_KEYS.values())
+        steps = []
+        size = 0
+        for step in self.list():
+            step_size = 1
+            for level, value in enumerate(step[:-1]):
+                if value == self.WILDCARD_VALUE:
+                    step_size *= time_max_digits[level] + 1
+            size += step_size
+            if size > self.COMPILED_INDEX_MAX_SIZE:
+                return None, None, None
+            steps.append(step)
+
+        # instants = {<call instant>: {<callback_name>, ...}, ...}
+        instants = {}
+        for step in steps:
+            indexes = [0]
+            for level, value in enumerate(step[:-1]):
+                if value == self.WILDCARD_VALUE:
+                    values = range(time_max_digits[level] + 1)
+                else:
+                    values = (value,)
+                indexes = [index * (time_max_digits[level] + 1) + value for index in indexes for value in values]
+            for index in indexes:
+                if index in instants:
+                    instants[index] = instants[index].union(step[-1])
+                else:
+                    instants[index] = step[-1]
+
+        instants_sorted = sorted(instants)
+        groups_ids = {}
+        groups = []
+        instants_groups = array('H')
+        for index in instants_sorted:
+            group = tuple(sorted(instants[index]))
+            if group not in groups_ids:
+                groups_ids[group] = len(groups)
+                # Ready-made dispatch list for run_callbacks()
+                # The snapshot of the time table can hold a callback, which has just been removed by another thread,
+                # then it is skipped.
+                dispatch_list = []
+                for callback_name in group:
+                    callback = self.callbacks.get(callback_name)
+                    memory = self.callbacks_memory.get(callback_name)
+                    if callback is not None and memory is not None:
+                        dispatch_list.append((callback_name, callback[0], memory))
+                groups.append(tuple(dispatch_list))
+            instants_groups.append(groups_ids[group])
+        return array('I', instants_sorted), instants_groups, groups
+
+    def _get_compiled_index(self):
+        """\
+        Returns the compiled index of the time table, the index is rebuilt after each change of the time table.
+
+        :return: tuple(<generation>, <sorted array of call instants> or None, <array of groups ids>, <groups>)
+        """
+        compiled_index = self._compiled_index
+        if compiled_index is None or compiled_index[0] != self._generation:
+            if self.COMPILED_INDEX_MAX_SIZE > 0 and \
+                    (self.time_table_engine is None or self.time_table_engine.COMPILED_INDEX):
+                compiled_index = (self._generation,) + self._compile()
+            else:
+                compiled_index = (self._generation, None, None, None)
+            self._compiled_index = compiled_index
+        return compiled_index
+
+    def _get_merged_time_table(self):
+        """\
+        Returns the time table expanded with merged wildcard branches.
+
+        It is memoized until the time table changes, it keeps only the last merged branch of each level.
+
+        :return: CounterDict
+        """
+        merged_time_table = self._merged_time_table
+        if merged_time_table is None or merged_time_table[0] != self._generation:
+            time_max_digits = list(self.TIME_TABLE_KEYS.values())
+            merged_time_table = (self._generation, CounterDict(self.time_table, time_max_digits, {}))
+            self._merged_time_table = merged_time_table
+        return merged_time_table[1]
+
+    def _iter_merged_time_table(self, nearest_time_pointer):
+        """\
+        Returns the generator of calls from the nearest time pointer to the end of the counter cycle.
 
+        :param nearest_time_pointer: index 0 -> highest counter
+        :return: (<pointer>, <leaf>)
+        """
         max_level = len(self.TIME_TABLE_KEYS)
+        pointer = [0] * max_level
+        # [ (<node>, <keys iterator>, <is pointer equal to nearest_time_pointer on higher levels>) ]
+        time_table = self._get_merged_time_table()
+        time_table_parts = [(time_table, iter(time_table.keys()), True)]
+        while time_table_parts:
+            time_table, keys, bounded = time_table_parts[-1]
+            level = len(time_table_parts) - 1
+            for key in keys:
+                # The branches before the nearest time pointer are not merged.
+                if bounded and key < nearest_time_pointer[level]:
+                    continue
+                pointer[level] = key
+                time_table_value = time_table[key]
+                if level == max_level - 1:
+                    yield tuple(pointer), time_table_value
+                else:
+                    time_table_parts.append((
+                        time_table_value, iter(time_table_value.keys()),
+                        bounded and key == nearest_time_pointer[level]
+                    ))
+                    break
+            else:
+                del time_table_parts[-1]
+
+    def _iter_next_pointers(self, nearest_time_pointer):
+        """\
+        Returns the endless generator of the next calls, starting from the nearest time pointer.
+
+        :param nearest_time_pointer: index 0 -> highest counter
+        :return: (<pointer>, (<callback_name>, ...))
+        """
+        compiled_index = self._get_compiled_index()
+        instants = compiled_index[1]
+        if instants is not None:
+            position = bisect_left(instants, self._pointer_to_index(nearest_time_pointer))
+            while True:
+                if position == len(instants):
+                    position = 0
+                group = compiled_index[3][compiled_index[2][position]]
+                yield self._index_to_pointer(instants[position]), tuple(data[0] for data in group)
+                position += 1
+
+        elif self.time_table_engine is not None:
+            while True:
+                pointer = self.time_table_engine.get_next_pointer(nearest_time_pointer)
+                yield pointer, tuple(sorted(set(self.time_table_engine.get_callbacks(pointer))))
+                nearest_time_pointer = self._get_nearest_time_pointer(*pointer)
+
+        else:
+            while True:
+                for pointer, callback_names in self._iter_merged_time_table(nearest_time_pointer):
+                    yield pointer, tuple(sorted(callback_names))
+                # The next counter cycle.
+                nearest_time_pointer = [0] * len(self.TIME_TABLE_KEYS)
+
+    def _time_table_copy_node(self, parent, key, copied):
+        """\
+        Returns the child node of the parent node, copied if it is shared with the published time table.
+
+        :param parent: node of the new version of the time table
+        :param key: key of the child node
+        :param copied: set of ids of the nodes created by the current change, they are changed in place
+        :return: SortedDict
+        """
+        node = parent[key]
+        if id(node) not in copied:
+            node = node.copy()
+            parent[key] = node
+            copied.add(id(node))
+        return node
+
+    def _time_table_add(self, callback_name, time_steps_validated):
+        """\
+        Adds the callback to the SortedDict tree.
+
+        The tree is copied on write: the changed nodes are copied, the unchanged branches are shared,
+        and the new version is published at the end with one assignment.
+
+        :param callback_name: callback name ID
+        :param time_steps_validated: list of lists of integers, index 0 -> highest counter
+        """
+        max_level = len(self.TIME_TABLE_KEYS)
+        callback_time_steps = self._callbacks_time_steps.setdefault(callback_name, [])
+        if time_steps_validated not in callback_time_steps:
+            callback_time_steps.append(time_steps_validated)
+        time_table = self.time_table.copy()
+        copied = {id(time_table)}
         # [ (time_table_part, <keys to check>, <current key>) ]
-        time_table_parts = [[self.time_table, time_steps_validated[0][:], None]]
+        time_table_parts = [[time_table, time_steps_validated[0][:], None]]
 
         while True:
             level = len(time_table_parts) - 1
@@ -160,26 +386,28 @@ class SimpleCounter():
                 current_key_init = False
 
             if current_key not in time_table_parts[-1][0]:
+                # SortedDict inserts the new key in order.
                 if level < (max_level - 1):
-                    time_table_parts[-1][0][current_key] = OrderedDict()
+                    current_value = SortedDict()
+                    copied.add(id(current_value))
                 else:
-                    time_table_parts[-1][0][current_key] = set()
-                dict_sorted = OrderedDict(sorted(time_table_parts[-1][0].items()))
-                time_table_parts[-1][0].clear()
-                time_table_parts[-1][0].update(dict_sorted)
-                del dict_sorted
+                    current_value = set()
+                time_table_parts[-1][0][current_key] = current_value
 
             current_value = time_table_parts[-1][0][current_key]
 
             if current_key_init:
                 if type(current_value) is set:
-                    current_value.add(callback_name)
+                    if callback_name not in current_value:
+                        # The leaf sets are never changed in place.
+                        time_table_parts[-1][0][current_key] = current_value.union((callback_name,))
 
                     if len(time_table_parts[-1][1]) > 0:
                         time_table_parts[-1][2] = None
                     else:
                         del time_table_parts[-1]
                 else:
+                    current_value = self._time_table_copy_node(time_table_parts[-1][0], current_key, copied)
                     time_table_parts[-1][2] = current_key
                     time_table_parts.append([current_value, time_steps_validated[level + 1][:], None])
 
@@ -192,8 +420,158 @@ class SimpleCounter():
                     else:
                         del time_table_parts[-1]
 
-        self.callbacks[callback_name] = (callback, removable)
-        self.callbacks_memory[callback_name] = {}
+        self.time_table = time_table
+
+    def _time_table_remove(self, callback_name):
+        """\
+        Removes the callback from the SortedDict tree.
+
+        Only the leaves holding the callback are visited, see self._callbacks_time_steps.
+
+        :param callback_name: callback name ID
+        """
+        self._time_table_remove_many((callback_name,))
+
+    def _time_table_remove_many(self, callback_names):
+        """\
+        Removes the callbacks from the SortedDict tree, in one pass over their leaves.
+
+        Only the leaves holding the callbacks are visited, see self._callbacks_time_steps.
+        The tree is copied on write, like in _time_table_add().
+
+        :param callback_names: set of callback name IDs
+        """
+        callbacks_time_steps = []
+        for callback_name in callback_names:
+            callbacks_time_steps.extend(self._callbacks_time_steps.pop(callback_name, ()))
+        if len(self._callbacks_time_steps) == 0:
+            # Nothing else remains in the tree.
+            self.time_table = SortedDict()
+            return
+        if len(callbacks_time_steps) == 0:
+            return
+
+        time_table = self.time_table.copy()
+        copied = {id(time_table)}
+        for time_steps in callbacks_time_steps:
+            for callback_leaf in self._iter_leaves(time_steps):
+                self._time_table_remove_leaf(time_table, callback_leaf, callback_names, copied)
+        self.time_table = time_table
+
+    def _iter_leaves(self, time_steps):
+        """\
+        Generates the keys of all leaves of the time steps, one leaf at a time.
+
+        :param time_steps: validated time steps, list of lists of integers, index 0 -> highest counter
+        :return: generator of tuple(<highest counter key>, ..., <lowest counter key>)
+        """
+        positions = [0] * len(time_steps)
+        while True:
+            yield tuple(time_steps[level][positions[level]] for level in range(len(time_steps)))
+            level = len(time_steps) - 1
+            while level >= 0:
+                positions[level] += 1
+                if positions[level] < len(time_steps[level]):
+                    break
+                positions[level] = 0
+                level -= 1
+            if level < 0:
+                return
+
+    def _time_table_remove_leaf(self, time_table, callback_leaf, callback_names, copied):
+        """\
+        Removes the callbacks from the leaf of the new version of the time table.
+
+        :param time_table: new version of the time table
+        :param callback_leaf: tuple(<highest counter key>, ..., <lowest counter key>)
+        :param callback_names: set of callback name IDs
+        :param copied: set of ids of the nodes created by the current change
+        """
+        node = time_table
+        for key in callback_leaf:
+            if key not in node:
+                # The leaf has already been removed, the time steps of the callbacks overlap.
+                return
+            node = node[key]
+        leaf = node.difference(callback_names)
+        if len(leaf) == len(node):
+            return
+
+        time_table_nodes = [time_table]
+        for key in callback_leaf[:-1]:
+            time_table_nodes.append(self._time_table_copy_node(time_table_nodes[-1], key, copied))
+        if len(leaf) > 0:
+            time_table_nodes[-1][callback_leaf[-1]] = leaf
+            return
+        # Removal of empty nodes, from the leaf to the root.
+        for level in range(len(callback_leaf) - 1, -1, -1):
+            del time_table_nodes[level][callback_leaf[level]]
+            if len(time_table_nodes[level]) > 0:
+                break
+
+    def _can_read(self):
+        """\
+        Returns whether the time table can be read now, the changes made by another thread are waited for.
+
+        The SortedDict tree is copied on write and published with one assignment,
+        after the callback is added and before it is removed from self.callbacks,
+        so it is always read from a consistent snapshot, without waiting.
+        The callbacks must not be run then, see RWLock.interrupted().
+
+        :return: boolean
+        """
+        if self.time_table_engine is None:
+            return True
+        return self._lock_rw.wait()
+
+    def _wait_for_unlock_rw(self):
+        """\
+        Waiting for the lock to be removed
+        """
+        raise NotImplementedError()
+
+    # SCOUNT - END
+    # #####################
+
+    def add(self, callback_name, callback, *time_steps, removable=True):
+        """\
+        Adds an entry to the current queue.
+
+        :param callback_name: callback name ID
+        :param callback: callable(<SimpleCRON_instance>, <callback_name>, <current_pointer>)
+        :param time_steps: list counters steps, eg. [[2,5], 3, 1, [2,3,4]], index 0 -> highest counter
+        :param removable: boolean if false, then the entry cannot normally be deleted
+        :return: None
+        """
+        if not callable(callback):
+            raise TypeError("Callback object isn't callable")
+
+        time_steps_validated = []
+        for time_step_key, (time_table_key, time_table_value) in enumerate(self.TIME_TABLE_KEYS.items()):
+            time_steps_validated.append(
+                self._validate_input(
+                    time_table_key,
+                    time_steps[time_step_key],
+                    time_table_value
+                )
+            )
+
+        # Imposing a blockade of changes on the callback database.
+        self._lock_rw.acquire()
+        try:
+            # The callback is added before it appears in the time table, see _can_read().
+            self.callbacks[callback_name] = (callback, removable)
+            self.callbacks_memory[callback_name] = {}
+
+            if self.time_table_engine is None:
+                self._time_table_add(callback_name, time_steps_validated)
+            else:
+                self.time_table_engine.add(callback_name, time_steps_validated)
+
+            self._generation += 1
+        finally:
+            # Removal of the blockade of changes in the callback database.
+            self._lock_rw.release()
 
     def callback_exists(self, callback_name):
         """\
@@ -214,6 +592,18 @@ class SimpleCounter():
         """
         raise NotImplementedError()
 
+    def get_steps_to_next_pointer(self, *current_pointer):
+        """\
+        Returns the number of the smallest steps to the nearest next pointer for the counter.
+
+        :param current_pointer: index 0 -> highest counter
+        :return: int or None
+        """
+        next_pointer = self.get_next_pointer(*current_pointer)
+        if next_pointer is None:
+            return None
+        return self._get_steps_between(current_pointer, next_pointer)
+
     def get_next_pointer(self, *current_pointer):
         """\
         Returns the nearest next pointer for the counter.
@@ -230,20 +620,28 @@ class SimpleCounter():
         # We find the nearest possible time after the current one
         next_time_pointer = self._get_nearest_time_pointer(*current_pointer)
 
-        def get_first(time_table_node_base):
+        instants = self._get_compiled_index()[1]
+        if instants is not None:
+            position = bisect_left(instants, self._pointer_to_index(next_time_pointer))
+            if position == len(instants):
+                # The nearest call will be in the next counter cycle.
+                position = 0
+            return self._index_to_pointer(instants[position])
+
+        if self.time_table_engine is not None:
+            return self.time_table_engine.get_next_pointer(next_time_pointer)
 
-            max_level = len(self.TIME_TABLE_KEYS)
+        def get_first(time_table_node_base, levels):
+            # Only the first key of each level is read.
             time_table_node = time_table_node_base
             out_value = tuple()
-            for level in range(max_level + 1):
-                if type(time_table_node) == set:
-                    break
-                key, time_table_node = next(iter(time_table_node.items()))
+            for level in range(levels):
+                key = next(iter(time_table_node.keys()))
                 out_value += (key,)
+                time_table_node = time_table_node[key]
             return out_value
 
-        time_max_digits = list(self.TIME_TABLE_KEYS.values())
-        time_table_base = CounterDict(self.time_table, time_max_digits)
+        time_table_base = self._get_merged_time_table()
 
         max_level = len(self.TIME_TABLE_KEYS)
         time_table_node = time_table_base
@@ -252,25 +650,26 @@ class SimpleCounter():
         level = 0
         while True:
             current_value = next_time_pointer[level]
-            for next_value, time_table_value in time_table_node.items():
+            # The branches before the current value are not merged.
+            for next_value in time_table_node.keys():
                 if next_value > current_value:
-                    out_value += (next_value,) + get_first(time_table_value)
+                    out_value += (next_value,)
+                    out_value += get_first(time_table_node[next_value], max_level - len(out_value))
                     return out_value
                 elif next_value == current_value:
                     out_value += (next_value,)
-                    time_table_node = time_table_value
-                    time_table_parts.append(time_table_value)
+                    time_table_node = time_table_node[next_value]
+                    time_table_parts.append(time_table_node)
                     level += 1
                     break
                 else:
                     continue
             else:
                 if (level - 1) == -1:
-                    return get_first(time_table_base)
-                if next_time_pointer[level - 1] == list(self.TIME_TABLE_KEYS.values())[level - 1]:
-                    next_time_pointer[level - 1] = 0
-                else:
-                    next_time_pointer[level - 1] = next_time_pointer[level - 1] + 1
+                    return get_first(time_table_base, max_level)
+                # Carry to the higher counter. A value above the maximum does not match any key,
+                # so the carry goes on to the next higher counter.
+                next_time_pointer[level - 1] = next_time_pointer[level - 1] + 1
                 next_time_pointer[level:] = [0] * len(next_time_pointer[level:])
                 out_value = out_value[:-1]
                 level -= 1
@@ -282,6 +681,51 @@ class SimpleCounter():
 
         raise Exception('???')
 
+    def iter_fire_times(self, start_pointer, count_or_until):
+        """\
+        Returns the generator of the next calls after the start pointer, found in one pass over the time table.
+
+        The time table should not be changed during the iteration.
+
+        :param start_pointer: index 0 -> highest counter
+        :param count_or_until: number of calls to return (int),
+            or the last pointer (tuple), at most one counter cycle after the start pointer
+        :return: (<pointer>, (<callback_name>, ...))
+        """
+        if len(self.callbacks) == 0:
+            return
+
+        self._wait_for_unlock_rw()
+
+        if type(count_or_until) is int:
+            count = count_or_until
+            if count <= 0:
+                return
+            until_offset = None
+        else:
+            count = None
+            cycle_size = self._get_cycle_size()
+            start_index = self._pointer_to_index(start_pointer)
+            until_offset = (self._pointer_to_index(count_or_until) - start_index) % cycle_size
+            if until_offset == 0:
+                until_offset = cycle_size
+            last_offset = 0
+
+        for pointer, callback_names in self._iter_next_pointers(self._get_nearest_time_pointer(*start_pointer)):
+            if until_offset is not None:
+                offset = (self._pointer_to_index(pointer) - start_index) % cycle_size
+                if offset == 0:
+                    offset = cycle_size
+                if offset > until_offset or offset <= last_offset:
+                    # After the until pointer or in the next counter cycle.
+                    return
+                last_offset = offset
+            yield pointer, callback_names
+            if count is not None:
+                count -= 1
+                if count == 0:
+                    return
+
     def list(self, _time_table_node=None, _prev_data=None):
         """\
         Returns the generator containing full and ordered information about all steps.
@@ -292,6 +736,10 @@ class SimpleCounter():
         """
         self._wait_for_unlock_rw()
 
+        if self.time_table_engine is not None:
+            yield from self.time_table_engine.list()
+            return
+
         if type(_time_table_node) is set:
             yield _prev_data + (_time_table_node,)
         else:
@@ -311,13 +759,51 @@ class SimpleCounter():
         :param force: force removal of the callback.
         :return:
         """
-        to_remove = []
-        for callback_name, data in self.callbacks.items():
-            # We're checking to see if we can remove it.
-            if force or data[1]:
-                to_remove.append(callback_name)
-        for callback_name in to_remove:
-            self.remove(callback_name, force)
+        self.remove_many(predicate=lambda callback_name: True, force=force)
+
+    def remove_many(self, callback_names=(), predicate=None, force=False, _lock=True):
+        """\
+        Removes many callbacks from the counters, in one pass over the time table.
+
+        :param callback_names: list of callback name IDs, if one of them cannot be removed, then an exception is raised
+        :param predicate: function(callback_name) -> boolean, selects the callbacks to remove,
+            callbacks that cannot be removed are skipped
+        :param force: force removal of the callbacks.
+        :return: set of the removed callback names
+        """
+        to_remove = set()
+        for callback_name in callback_names:
+            if callback_name in self.callbacks:
+                if not force and not self.callbacks[callback_name][1]:
+                    raise Exception('This callback cannot be removed!')
+                to_remove.add(callback_name)
+        if predicate is not None:
+            for callback_name, data in self.callbacks.items():
+                # We're checking to see if we can remove it.
+                if (force or data[1]) and predicate(callback_name):
+                    to_remove.add(callback_name)
+        if len(to_remove) == 0:
+            return to_remove
+
+        # Imposing a blockade of changes on the callback database.
+        if _lock:
+            self._lock_rw.acquire()
+        try:
+            if self.time_table_engine is None:
+                self._time_table_remove_many(to_remove)
+            else:
+                for callback_name in to_remove:
+                    self.time_table_engine.remove(callback_name)
+
+            for callback_name in to_remove:
+                self.callbacks.pop(callback_name)
+                self.callbacks_memory.pop(callback_name)
+            self._generation += 1
+        finally:
+            # Removal of the blockade of changes in the callback database.
+            if _lock:
+                self._lock_rw.release()
+        return to_remove
 
     def remove(self, callback_name, force=False, _lock=True):
         """\
@@ -330,57 +816,59 @@ class SimpleCounter():
         if callback_name not in self.callbacks:
             return
 
-        # Imposing a blockade of changes on the callback database.
-        self._lock_rw = _lock
-
         if not force:
             if not self.callbacks[callback_name][1]:
                 raise Exception('This callback cannot be removed!')
 
-        max_level = len(self.TIME_TABLE_KEYS)
-        # [ (time_table_part, <keys to check>, <current key>) ]
-        time_table_parts = [[self.time_table, list(self.time_table.keys()), None]]
-        while len(time_table_parts) > 0:
-            if time_table_parts[-1][2] is None:
-                if len(time_table_parts[-1][1]) > 0:
-                    current_key = time_table_parts[-1][1].pop()
-                    current_key_init = True
-                else:
-                    del time_table_parts[-1]
-                    continue
+        # Imposing a blockade of changes on the callback database.
+        if _lock:
+            self._lock_rw.acquire()
+        try:
+            if self.time_table_engine is None:
+                self._time_table_remove(callback_name)
             else:
-                current_key = time_table_parts[-1][2]
-                current_key_init = False
+                self.time_table_engine.remove(callback_name)
 
-            current_value = time_table_parts[-1][0][current_key]
+            self.callbacks.pop(callback_name)
+            self.callbacks_memory.pop(callback_name)
+            self._generation += 1
+        finally:
+            # Removal of the blockade of changes in the callback database.
+            if _lock:
+                self._lock_rw.release()
 
-            if current_key_init:
-                if type(current_value) is set:
-                    if callback_name in current_value:
-                        current_value.remove(callback_name)
-                        if len(current_value) == 0:
-                            del time_table_parts[-1][0][current_key]
-                    if len(time_table_parts[-1][1]) > 0:
-                        time_table_parts[-1][2] = None
-                    else:
-                        del time_table_parts[-1]
-                else:
-                    time_table_parts[-1][2] = current_key
-                    time_table_parts.append([current_value, list(current_value.keys()), None])
+    def _run_callback(self, callback_name, callback, memory, pointer):
+        """\
+        Runs the callback, or passes it to the executor.
 
-            else:
-                if len(current_value) == 0:
-                    del time_table_parts[-1][0][current_key]
-                if len(time_table_parts[-1][1]) > 0:
-                    time_table_parts[-1][2] = None
-                else:
-                    del time_table_parts[-1]
+        If the executor rejects the callback, then the exception is passed to the callback_exception_processors.
 
-        self.callbacks.pop(callback_name)
-        self.callbacks_memory.pop(callback_name)
+        :param callback_name: callback name ID
+        :param callback: callable(<SimpleCRON_instance>, <callback_name>, <current_pointer>, <memory>)
+        :param memory: memory of the callback
+        :param pointer: index 0 -> highest counter
+        """
+        if self.executor is None:
+            self._call_callback(callback_name, callback, memory, pointer)
+        elif not self.executor.submit(self._call_callback, callback_name, callback, memory, pointer):
+            e = Exception('The executor queue is full, the callback is skipped: %s' % callback_name)
+            for processor in self.callback_exception_processors:
+                processor(e)
+
+    def _call_callback(self, callback_name, callback, memory, pointer):
+        """\
+        Calls the callback, exceptions are passed to the callback_exception_processors.
 
-        # Removal of the blockade of changes in the callback database.
-        self._lock_rw = False
+        :param callback_name: callback name ID
+        :param callback: callable(<SimpleCRON_instance>, <callback_name>, <current_pointer>, <memory>)
+        :param memory: memory of the callback
+        :param pointer: index 0 -> highest counter
+        """
+        try:
+            callback(self, callback_name, pointer, memory)
+        except Exception as e:
+            for processor in self.callback_exception_processors:
+                processor(e)
 
     def run_callbacks(self, *global_current_pointer):
         """\
@@ -391,22 +879,50 @@ class SimpleCounter():
         """
         self._wait_for_unlock_rw()
 
+        compiled_index = self._get_compiled_index()
+        instants = compiled_index[1]
+        if instants is not None:
+            index = self._pointer_to_index(global_current_pointer)
+            position = bisect_left(instants, index)
+            if position < len(instants) and instants[position] == index:
+                for callback_name, callback, memory in compiled_index[3][compiled_index[2][position]]:
+                    # Callbacks can be removed during the call.
+                    if compiled_index[0] != self._generation and callback_name not in self.callbacks:
+                        continue
+                    self._run_callback(callback_name, callback, memory, global_current_pointer)
+            return
+
+        if self.time_table_engine is not None:
+            for callback_name in set(self.time_table_engine.get_callbacks(global_current_pointer)):
+                # Callbacks can be removed during the call.
+                if callback_name not in self.callbacks:
+                    continue
+                self._run_callback(
+                    callback_name,
+                    self.callbacks[callback_name][0],
+                    self.callbacks_memory[callback_name],
+                    global_current_pointer
+                )
+            return
+
         get_exactly_stack = [(self.time_table, global_current_pointer)]
+        # A callback of several matching leaves (overlapping entries) is run once.
+        called = set()
 
         while get_exactly_stack:
             time_table_node, current_pointer = get_exactly_stack.pop()
             if type(time_table_node) == set:
+                # The leaf sets are never changed in place, callbacks removed during the call are skipped.
                 for callback_name in time_table_node:
-                    try:
-                        self.callbacks[callback_name][0](
-                            self,
-                            callback_name,
-                            global_current_pointer,
-                            self.callbacks_memory[callback_name]
-                        )
-                    except Exception as e:
-                        for processor in self.callback_exception_processors:
-                            processor(e)
+                    if callback_name in called or callback_name not in self.callbacks:
+                        continue
+                    called.add(callback_name)
+                    self._run_callback(
+                        callback_name,
+                        self.callbacks[callback_name][0],
+                        self.callbacks_memory[callback_name],
+                        global_current_pointer
+                    )
             else:
                 if self.WILDCARD_VALUE in time_table_node:
                     get_exactly_stack.append((time_table_node[self.WILDCARD_VALUE], current_pointer[1:]))
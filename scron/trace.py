@@ -0,0 +1,244 @@
+# Copyright 2019 Wojciech Banaś
+# This code is released under the GPL3 or individual commercial license.
+
+try:
+    from struct import pack_into, unpack_from, pack, unpack
+except ImportError:
+    from ustruct import pack_into, unpack_from, pack, unpack
+
+try:
+    from gc import mem_alloc
+except ImportError:
+    # Python 3
+    mem_alloc = None
+
+from utime import ticks_us, ticks_ms, ticks_diff
+
+# Record: <ticks_us() & 0xffffffff>, <event>, <job ID>, <duration>, <memory delta in bytes>
+RECORD_FORMAT = '<IHHIi'
+RECORD_SIZE = 16
+# Offset of the job ID in the record.
+RECORD_JOB_OFFSET = 6
+
+# Events, duration:
+# the callbacks of a step have been run, duration in us
+EVENT_TICK = 1
+# the callback has been run, duration in us
+EVENT_CALLBACK = 2
+# the next call has been planned, duration: ms to the next call
+EVENT_RESCHEDULE = 3
+
+EVENT_NAMES = {
+    EVENT_TICK: 'tick',
+    EVENT_CALLBACK: 'callback',
+    EVENT_RESCHEDULE: 'reschedule',
+}
+
+# The job ID of the events without a callback.
+NO_JOB = 0xffff
+# The job ID of the callbacks, which have got no ID of their own, because all IDs are used.
+OTHER_JOB = 0xfffe
+
+
+class Trace:
+    """\
+    Binary trace of the scheduler events, instead of printing them during the calls (see debug_call).
+
+    Each event is written as a record of RECORD_SIZE bytes into a preallocated ring buffer,
+    when the buffer is full the oldest records are overwritten. Decode the trace with dump() or iter_records(),
+    on the device or on the host after save() and load().
+
+    Usage:
+    trace = Trace(records=256)
+    trace.attach(simple_cron)
+    ...
+    dump(trace)
+    """
+
+    def __init__(self, records=64):
+        """\
+        :param records: number of the records in the ring buffer
+        """
+        self.records = records
+        self.buffer = bytearray(records * RECORD_SIZE)
+        # The number of all written records, the next record is written at position % records.
+        self.position = 0
+        # Job IDs of the callbacks, the ID is the index in the names list.
+        # The IDs of the removed callbacks are reused, see get_job_id().
+        # ids = {<callback_name>: <job ID>, ...}
+        self.ids = {}
+        self.names = []
+        self._mem_before = 0
+
+    def attach(self, simple_cron):
+        """\
+        Starts the tracing of the SimpleCRON instance.
+
+        :param simple_cron: SimpleCRON instance
+        """
+        simple_cron.add_hook(simple_cron.HOOK_AFTER_TICK, self._after_tick)
+        simple_cron.add_hook(simple_cron.HOOK_BEFORE_CALLBACK, self._before_callback)
+        simple_cron.add_hook(simple_cron.HOOK_AFTER_CALLBACK, self._after_callback)
+        simple_cron.add_hook(simple_cron.HOOK_RESCHEDULE, self._reschedule)
+
+    def detach(self, simple_cron):
+        """\
+        Stops the tracing of the SimpleCRON instance.
+
+        :param simple_cron: SimpleCRON instance
+        """
+        simple_cron.remove_hook(simple_cron.HOOK_AFTER_TICK, self._after_tick)
+        simple_cron.remove_hook(simple_cron.HOOK_BEFORE_CALLBACK, self._before_callback)
+        simple_cron.remove_hook(simple_cron.HOOK_AFTER_CALLBACK, self._after_callback)
+        simple_cron.remove_hook(simple_cron.HOOK_RESCHEDULE, self._reschedule)
+
+    def clear(self):
+        """\
+        Removes all records.
+        """
+        self.position = 0
+
+    def write(self, event, job_id, duration, memory_delta=0):
+        """\
+        Writes the record into the ring buffer, nothing is allocated.
+
+        :param event: EVENT_*
+        :param job_id: job ID, see get_job_id(), or NO_JOB
+        :param duration: duration of the event, in the units of the event
+        :param memory_delta: change of the allocated memory in bytes
+        """
+        pack_into(
+            RECORD_FORMAT, self.buffer, (self.position % self.records) * RECORD_SIZE,
+            ticks_us() & 0xffffffff, event, job_id, duration, memory_delta
+        )
+        self.position += 1
+
+    def get_job_id(self, callback_name, simple_cron=None):
+        """\
+        Returns the job ID of the callback, the ID is assigned at the first event of the callback.
+
+        The ID of a callback removed from simple_cron is given to the new callback, when no record in the buffer
+        uses it, so the IDs do not grow with the callbacks added and removed over time. When all IDs are used,
+        OTHER_JOB is returned.
+
+        :param callback_name: callback name ID
+        :param simple_cron: SimpleCRON instance of the callback, None - the IDs are not reused
+        :return: int
+        """
+        job_id = self.ids.get(callback_name)
+        if job_id is None:
+            job_id = self._get_free_job_id(simple_cron)
+            if job_id is not None:
+                del self.ids[self.names[job_id]]
+                self.names[job_id] = callback_name
+            elif len(self.names) < OTHER_JOB:
+                job_id = len(self.names)
+                self.names.append(callback_name)
+            else:
+                return OTHER_JOB
+            self.ids[callback_name] = job_id
+        return job_id
+
+    def _get_free_job_id(self, simple_cron):
+        """\
+        Returns the ID of a removed callback, which is not used by the records in the buffer.
+
+        :param simple_cron: SimpleCRON instance or None
+        :return: int or None
+        """
+        if simple_cron is None:
+            return None
+        removed = [job_id for job_id, callback_name in enumerate(self.names)
+                   if not simple_cron.callback_exists(callback_name)]
+        if not removed:
+            return None
+        used = set()
+        for position in range(max(0, self.position - self.records), self.position):
+            used.add(unpack_from(
+                '<H', self.buffer, (position % self.records) * RECORD_SIZE + RECORD_JOB_OFFSET
+            )[0])
+        for job_id in removed:
+            if job_id not in used:
+                return job_id
+        return None
+
+    def _after_tick(self, simple_cron, pointer, duration_us):
+        self.write(EVENT_TICK, NO_JOB, duration_us)
+
+    def _before_callback(self, simple_cron, callback_name, pointer, lateness_ms):
+        if mem_alloc is not None:
+            self._mem_before = mem_alloc()
+
+    def _after_callback(self, simple_cron, callback_name, pointer, duration_us):
+        memory_delta = 0 if mem_alloc is None else mem_alloc() - self._mem_before
+        self.write(EVENT_CALLBACK, self.get_job_id(callback_name, simple_cron), duration_us, memory_delta)
+
+    def _reschedule(self, simple_cron, deadline):
+        period_ms = 0 if deadline is None else max(0, ticks_diff(deadline[1], ticks_ms()))
+        self.write(EVENT_RESCHEDULE, NO_JOB, period_ms)
+
+
+def save(trace, stream):
+    """\
+    Writes the trace into the stream (e.g. a file opened in the 'wb' mode), see load().
+
+    :param trace: Trace instance
+    :param stream: binary stream
+    """
+    stream.write(pack('<III', trace.records, trace.position, len(trace.names)))
+    for callback_name in trace.names:
+        name = str(callback_name).encode()
+        stream.write(pack('<H', len(name)))
+        stream.write(name)
+    stream.write(trace.buffer)
+
+
+def load(stream):
+    """\
+    Reads the trace written by save(), e.g. on the host.
+
+    :param stream: binary stream
+    :return: Trace instance
+    """
+    records, position, names = unpack('<III', stream.read(12))
+    trace = Trace(records)
+    trace.position = position
+    for job_id in range(names):
+        size = unpack('<H', stream.read(2))[0]
+        trace.get_job_id(stream.read(size).decode())
+    trace.buffer[:] = stream.read(records * RECORD_SIZE)
+    return trace
+
+
+def iter_records(trace):
+    """\
+    Decodes the records of the trace, from the oldest.
+
+    :param trace: Trace instance
+    :return: generator of tuple(<ticks_us>, <event>, <callback_name or None>, <duration>, <memory delta>),
+        the callback name is None also for OTHER_JOB
+    """
+    first = max(0, trace.position - trace.records)
+    for position in range(first, trace.position):
+        ticks, event, job_id, duration, memory_delta = unpack_from(
+            RECORD_FORMAT, trace.buffer, (position % trace.records) * RECORD_SIZE
+        )
+        callback_name = trace.names[job_id] if job_id < len(trace.names) else None
+        yield ticks, event, callback_name, duration, memory_delta
+
+
+def dump(trace, output=print):
+    """\
+    Prints the records of the trace, from the oldest.
+
+    :param trace: Trace instance
+    :param output: function(line)
+    """
+    for ticks, event, callback_name, duration, memory_delta in iter_records(trace):
+        if event == EVENT_RESCHEDULE:
+            output('%10d %-10s next call in %d ms' % (ticks, EVENT_NAMES[event], duration))
+        elif event == EVENT_CALLBACK:
+            output('%10d %-10s %s %d us, memory %+d B' % (
+                ticks, EVENT_NAMES[event], callback_name, duration, memory_delta))
+        else:
+            output('%10d %-10s %d us' % (ticks, EVENT_NAMES.get(event, event), duration))
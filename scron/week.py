@@ -1,11 +1,9 @@
 # Copyright 2019 Wojciech Banaś
 # This code is released under the GPL3 or individual commercial license.
-import gc
-
 from machine import Timer
-from utime import localtime, sleep_ms, time, ticks_ms
+from utime import localtime, ticks_add
 
-from scron.helpers import OrderedDict, mktime
+from scron.helpers import OrderedDict
 
 from scron.base import SimpleCRONBase
 
@@ -21,6 +19,7 @@ class SimpleCRON(SimpleCRONBase):
         Adds an entry to the current queue.
 
         After adding a callback, the next call is recalculated.
+        If it is called by a callback in the QUEUE_CHANGES mode, the entry is added after all callbacks of the step.
 
         :param callback_name: callback name ID
         :param callback: callable
@@ -31,7 +30,12 @@ class SimpleCRON(SimpleCRONBase):
         :param removable: boolean if false, then the entry cannot normally be deleted
         :return: None
         """
-        gc.collect()
+        if self._queue_change(self.add, (callback_name, callback, seconds, minutes, hours, weekdays),
+                              {'removable': removable}):
+            return
+        # In the batch() block the garbage is collected once, at the end of the block.
+        if self._batch_level == 0:
+            self._collect_garbage(False)
         super(SimpleCRON, self).add(callback_name, callback, weekdays, hours, minutes, seconds, removable=removable)
         self._first_step()
 
@@ -60,55 +64,83 @@ class SimpleCRON(SimpleCRONBase):
         """
         return super(SimpleCRON, self).get_next_pointer(weekday, hour, minute, second)
 
+    def get_steps_to_next_pointer(self, weekday, hour, minute, second):
+        """
+        Returns the number of seconds to the nearest next pointer for the counter.
+
+        :param weekday: 0-6, 0=monday,6=sunday
+        :param hour: 0-23
+        :param minute: 0-59
+        :param second: 0-59
+        :return: int or None
+        """
+        return super(SimpleCRON, self).get_steps_to_next_pointer(weekday, hour, minute, second)
+
     def next_step(self, *last_time_pointer):
         """
-        Returns the generated function for the timer.
+        Returns the function for the timer.
+
+        The same bound method is returned each time, the last call pointer is kept in the instance.
 
         :param last_time_pointer: last call pointer
         :return: function(timer_instance)
         """
+        self._last_time_pointer = last_time_pointer
+        return self._timer_callback
 
-        def _next_step(timer):
-            current = localtime()
-            current_pointer = self.get_current_pointer()
-            next_time_pointer = self.get_next_pointer(*current_pointer)
-
-            def is_the_same_callback():
-                # Skip callbacks calls when time does not match.
-                if next_time_pointer == last_time_pointer:
-                    if current_pointer == next_time_pointer:
-                        return False
-                    return True
-                return False
-
-            # There are no new tasks in the future, so we finish
-            if next_time_pointer == None:
-                if not is_the_same_callback():
-                    self.run_callbacks(*last_time_pointer)
-                return
+    def _timer_step(self, timer):
+        """\
+        Runs the callbacks of the last call pointer and sets the timer for the next call.
 
-            # zero day
-            def get_zero_day_time_sec(year, month, mday, hour, minute, second, weekday, yearday):
-                return mktime(current) - weekday * 24 * 60 * 60 - hour * 60 * 60 - minute * 60 - second
+        No functions are created here, the timer gets the same bound method each time.
 
-            def get_pointer_sec(weekday, hour, minute, second):
-                return weekday * 24 * 60 * 60 + hour * 60 * 60 + minute * 60 + second
+        :param timer: timer instance
+        """
+        last_time_pointer = self._last_time_pointer
+        if self._lock_rw.interrupted() or not self._can_read():
+            # The timer interrupted a change of the time table, the step is run after the change,
+            # so the callbacks can change the time table (e.g. the run_times decorator).
+            self._lock_rw.defer(self._deferred_timer_step, (timer, last_time_pointer))
+            return
+        self._start_step(last_time_pointer, self.deadline)
+
+        # The clock is read once, the period is counted from the pointers.
+        current_pointer = self.get_current_pointer()
+        next_time_pointer = self.get_next_pointer(*current_pointer)
+
+        # Skip callbacks calls when time does not match.
+        is_the_same_callback = next_time_pointer == last_time_pointer and current_pointer != next_time_pointer
+
+        # There are no new tasks in the future, so we finish
+        if next_time_pointer == None:
+            self._set_deadline(None)
+            if not is_the_same_callback:
+                self.run_callbacks(*last_time_pointer)
+            return
 
-            zero_day_time_sec = get_zero_day_time_sec(*current)
+        period_seconds = self._get_steps_between(current_pointer, next_time_pointer)
+        time_change_pointer = self._get_time_change_pointer()
+        period_mili_seconds = self._get_time_change_correction(period_seconds * 1000, time_change_pointer)
+        self._set_deadline((next_time_pointer, ticks_add(time_change_pointer, period_mili_seconds)))
 
-            period_seconds = zero_day_time_sec + get_pointer_sec(*next_time_pointer) - mktime(current)
-            period_mili_seconds = self._get_time_change_correction(period_seconds * 1000)
+        self._last_time_pointer = next_time_pointer
+        timer.init(
+            period=period_mili_seconds,
+            mode=Timer.ONE_SHOT,
+            callback=self._timer_callback
+        )
 
-            timer.init(
-                period=period_mili_seconds,
-                mode=Timer.ONE_SHOT,
-                callback=self.next_step(*next_time_pointer)
-            )
+        if not is_the_same_callback:
+            self.run_callbacks(*last_time_pointer)
 
-            if not is_the_same_callback():
-                self.run_callbacks(*last_time_pointer)
+    def _deferred_timer_step(self, step):
+        """\
+        Runs the timer step, which was deferred until the end of the change of the time table.
 
-        return _next_step
+        :param step: tuple(<timer instance>, <last call pointer>)
+        """
+        timer, self._last_time_pointer = step
+        self._timer_step(timer)
 
     def run_callbacks(self, weekday, hour, minute, second):
         """
@@ -119,8 +151,8 @@ class SimpleCRON(SimpleCRONBase):
         :param minute: 0-59
         :param second: 0-59
         """
-        gc.collect()
-        return super(SimpleCRON, self).run_callbacks(weekday, hour, minute, second)
-        gc.collect()
+        super(SimpleCRON, self).run_callbacks(weekday, hour, minute, second)
+        # The garbage is collected after the callbacks, so the collection does not delay them.
+        self._collect_garbage(True)
 
 simple_cron = SimpleCRON()
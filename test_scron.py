@@ -1,7 +1,9 @@
 import unittest
 from scron.week import SimpleCRON
-from scron.helpers import CounterDict, merge_tree
-from scron.decorators import run_times, call_counter, time_since_last_call, successfully_run_times
+from scron.helpers import CounterDict, MergedTree, SortedDict, merge_tree
+from scron.bitmask import BitmaskTimeTable, lowest_bit, next_bit
+from scron.compact import CompactTimeTable
+from scron.decorators import run_times, call_counter, time_since_last_call, successfully_run_times, overrun
 
 try:
     from collections import OrderedDict
@@ -57,6 +59,44 @@ class TestFunctions(unittest.TestCase):
         )
 
 
+    def test_sorted_dict(self):
+        sorted_dict = SortedDict()
+        for key in [5, -1, 3, 59, 0, 3]:
+            sorted_dict[key] = str(key)
+        self.assertEqual(list(sorted_dict.keys()), [-1, 0, 3, 5, 59])
+        self.assertEqual(list(sorted_dict.items())[1], (0, '0'))
+        del sorted_dict[3]
+        self.assertEqual(list(sorted_dict), [-1, 0, 5, 59])
+        self.assertEqual(sorted_dict, {59: '59', 0: '0', 5: '5', -1: '-1'})
+        self.assertNotEqual(sorted_dict, {0: '0'})
+        sorted_dict.clear()
+        self.assertEqual(sorted_dict, {})
+
+
+    def test_merged_tree(self):
+        tree_a = OrderedDict([
+            (1, OrderedDict([(1, {'1_1'}), (2, {'1_2'})])),
+            (3, OrderedDict([(1, {'3_1'})])),
+        ])
+        tree_b = OrderedDict([
+            (2, OrderedDict([(1, {'b2_1'})])),
+            (3, OrderedDict([(1, {'b3_1'}), (4, {'b3_4'})])),
+        ])
+        merged_tree = MergedTree(tree_a, tree_b)
+        self.assertEqual(list(merged_tree.keys()), [1, 2, 3])
+        self.assertTrue(merged_tree[1] is tree_a[1])
+        self.assertEqual(merged_tree, merge_tree(tree_a, tree_b))
+        self.assertEqual(list(merged_tree[3].keys()), [1, 4])
+        self.assertEqual(merged_tree[3][1], {'3_1', 'b3_1'})
+        self.assertEqual(len(merged_tree[3][1]), 2)
+        # Merged leaves can be merged again.
+        self.assertEqual(sorted(MergedTree(merged_tree[3][1], {'3_1', 'c3_1'})), ['3_1', 'b3_1', 'c3_1'])
+
+        # The keys are read on demand.
+        keys = merged_tree.keys()
+        self.assertEqual(next(keys), 1)
+
+
 class TestTimeTableNormalDict(unittest.TestCase):
 
     def setUp(self):
@@ -179,6 +219,19 @@ class TestTimeTableWildcardDict(unittest.TestCase):
         )
 
 
+    def test_merge_cache(self):
+        merge_cache = {}
+        counter_dict = CounterDict(self.count_table, self.count_table_limits, merge_cache)
+        items = list(counter_dict.items())
+        self.assertEqual(items, list(CounterDict(self.count_table, self.count_table_limits).items()))
+        # The last merged branch of each level is created once.
+        key = items[-1][0]
+        child_key = list(items[-1][1].keys())[0]
+        self.assertTrue(counter_dict[key] is counter_dict[key])
+        self.assertTrue(counter_dict[key][child_key] is counter_dict[key][child_key])
+        self.assertEqual(sorted(merge_cache.keys()), [1, 2])
+
+
 class TestSimpleCRON(unittest.TestCase):
 
     def setUp(self):
@@ -485,6 +538,81 @@ class TestSimpleCRON(unittest.TestCase):
             []
         )
 
+    def test_remove__reverse_index(self):
+        callback = lambda *a, **k: None
+        self.simple_cron.add('a', callback, seconds=[1, 2], minutes=3, hours=4, weekdays=5)
+        self.simple_cron.add('b', callback, seconds=2, minutes=3, hours=[4, 6], weekdays=5)
+        self.simple_cron.add('a', callback, seconds=1, minutes=3, hours=4, weekdays=[5, 6])
+        if self.simple_cron.time_table_engine is None:
+            self.assertEqual(
+                sorted(
+                    callback_leaf
+                    for time_steps in self.simple_cron._callbacks_time_steps['a']
+                    for callback_leaf in self.simple_cron._iter_leaves(time_steps)
+                ),
+                [(5, 4, 3, 1), (5, 4, 3, 1), (5, 4, 3, 2), (6, 4, 3, 1)]
+            )
+        self.simple_cron.remove('a')
+        self.assertEqual(
+            list(self.simple_cron.list()),
+            [
+                (5, 4, 3, 2, {'b'}),
+                (5, 6, 3, 2, {'b'}),
+            ]
+        )
+        self.simple_cron.remove('b')
+        self.assertEqual(self.simple_cron.time_table, {})
+        self.assertEqual(self.simple_cron._callbacks_time_steps, {})
+
+    def test_copy_on_write(self):
+        if self.simple_cron.time_table_engine is not None:
+            return
+        callback = lambda *a, **k: None
+        self.simple_cron.add('a', callback, seconds=[1, 2], minutes=3, hours=4, weekdays=5)
+        self.simple_cron.add('b', callback, seconds=2, minutes=3, hours=[4, 6], weekdays=6)
+        time_table = self.simple_cron.time_table
+        time_table_repr = repr(time_table)
+
+        self.simple_cron.add('c', callback, seconds=2, minutes=3, hours=4, weekdays=5)
+        self.assertFalse(self.simple_cron.time_table is time_table)
+        # The published versions are never changed, the unchanged branches are shared.
+        self.assertEqual(repr(time_table), time_table_repr)
+        self.assertTrue(self.simple_cron.time_table[6] is time_table[6])
+        self.assertEqual(self.simple_cron.time_table[5][4][3][2], {'a', 'c'})
+
+        time_table = self.simple_cron.time_table
+        time_table_repr = repr(time_table)
+        self.simple_cron.remove_many(['a', 'c'])
+        self.assertEqual(repr(time_table), time_table_repr)
+        self.assertTrue(self.simple_cron.time_table[6] is time_table[6])
+        self.assertEqual(list(self.simple_cron.time_table.keys()), [6])
+
+    def test_remove_many(self):
+        callback = lambda *a, **k: None
+        self.simple_cron.add('a1', callback, seconds=[1, 2], minutes=3, hours=4, weekdays=5)
+        self.simple_cron.add('a2', callback, seconds=2, minutes=3, hours=[4, 6])
+        self.simple_cron.add('b1', callback, seconds=1, minutes=3, hours=4, weekdays=5)
+        self.simple_cron.add('b2', callback, seconds=2, minutes=3, removable=False)
+
+        with self.assertRaises(Exception):
+            self.simple_cron.remove_many(['a1', 'b2'])
+        self.assertEqual(len(self.simple_cron.callbacks), 4)
+
+        self.assertEqual(self.simple_cron.remove_many(['a1', 'a2', 'x']), {'a1', 'a2'})
+        self.assertEqual(
+            list(self.simple_cron.list()),
+            [
+                (-1, -1, 3, 2, {'b2'}),
+                (5, 4, 3, 1, {'b1'}),
+            ]
+        )
+        self.assertEqual(self.simple_cron.remove_many(predicate=lambda name: name.startswith('b')), {'b1'})
+        self.assertEqual(list(self.simple_cron.list()), [(-1, -1, 3, 2, {'b2'})])
+        self.assertEqual(self.simple_cron.remove_many(['b2'], force=True), {'b2'})
+        self.assertEqual(self.simple_cron.callbacks, {})
+        self.assertEqual(self.simple_cron.callbacks_memory, {})
+        self.assertEqual(self.simple_cron.time_table, {})
+
     def test_get_next_time_pointer(self):
         self.simple_cron.remove_all()
         self.assertEqual(self.simple_cron.get_next_pointer(0, 0, 0, 0), None)
@@ -790,6 +918,1151 @@ class TestSimpleCRON(unittest.TestCase):
         self.assertEqual(list(self.simple_cron._get_nearest_time_pointer(*[6, 23, 59, 59])), [0, 0, 0, 0])
 
 
+class TestBitmask(unittest.TestCase):
+
+    def test_lowest_bit(self):
+        self.assertEqual(lowest_bit(1), 0)
+        self.assertEqual(lowest_bit(0b101000), 3)
+        self.assertEqual(lowest_bit(1 << 59), 59)
+
+    def test_next_bit(self):
+        self.assertEqual(next_bit(0b101000, 0), 3)
+        self.assertEqual(next_bit(0b101000, 3), 3)
+        self.assertEqual(next_bit(0b101000, 4), 5)
+        self.assertEqual(next_bit(0b101000, 6), -1)
+        self.assertEqual(next_bit(0, 0), -1)
+
+
+class TestSimpleCRONBitmask(TestSimpleCRON):
+
+    def setUp(self):
+        self.simple_cron = SimpleCRON(time_table_engine=BitmaskTimeTable)
+
+
+class TestSimpleCRONCompact(TestSimpleCRON):
+
+    def setUp(self):
+        self.simple_cron = SimpleCRON(time_table_engine=CompactTimeTable)
+
+    def test_records(self):
+        callback = lambda *a, **k: None
+        time_table_engine = self.simple_cron.time_table_engine
+        self.assertEqual(time_table_engine.record_size, 22)
+        self.simple_cron.add('a', callback, seconds=[0, 59], minutes=1)
+        self.simple_cron.add('b', callback, seconds=1, hours=range(0, 24, 2))
+        self.simple_cron.add('a', callback, seconds=[0, 59], minutes=1)
+        self.assertEqual(time_table_engine.records_count, 2)
+        self.assertEqual(time_table_engine.ids, {'a': 0, 'b': 1})
+        self.assertEqual(len(time_table_engine.records), 44)
+
+        self.simple_cron.remove('a')
+        self.assertEqual(time_table_engine.records_count, 1)
+        self.assertEqual(list(self.simple_cron.list())[0], (-1, 0, -1, 1, {'b'}))
+        # The ID and the space of the removed callback are reused.
+        self.simple_cron.add('c', callback, seconds=5)
+        self.assertEqual(time_table_engine.ids, {'b': 1, 'c': 0})
+        self.assertEqual(len(time_table_engine.records), 44)
+
+    def test_compiled_index_disabled(self):
+        self.simple_cron.add('a', lambda *a, **k: None, seconds=10)
+        self.assertEqual(self.simple_cron.get_next_pointer(0, 0, 0, 0), (0, 0, 0, 10))
+        self.assertEqual(self.simple_cron._get_compiled_index()[1:], (None, None, None))
+
+
+class TestSimpleCRONWithoutCompiledIndex(TestSimpleCRON):
+
+    def setUp(self):
+        self.simple_cron = SimpleCRON()
+        self.simple_cron.COMPILED_INDEX_MAX_SIZE = 0
+
+    def test_merge_cache__bounded(self):
+        callback = lambda *a, **k: None
+        self.simple_cron.add('a', callback, seconds=[0, 30])
+        self.simple_cron.add('b', callback, seconds=10, minutes=range(0, 59, 15))
+        self.simple_cron.add('c', callback, seconds=0, minutes=0, hours=3, weekdays=[0, 1])
+        merge_cache = self.simple_cron._get_merged_time_table().merge_cache
+        # A day of steps.
+        pointer = (0, 0, 0, 0)
+        steps = 0
+        while pointer < (1, 0, 0, 0):
+            pointer = self.simple_cron.get_next_pointer(*pointer)
+            steps += 1
+            self.assertTrue(len(merge_cache) <= len(self.simple_cron.TIME_TABLE_KEYS))
+        # The calls of "c" at 3:00:00 are the calls of "a".
+        self.assertEqual(steps, 2 * 24 * 60 + 24 * 4)
+
+
+class TestCompiledIndex(unittest.TestCase):
+
+    def test_pointer_to_index(self):
+        simple_cron = SimpleCRON()
+        self.assertEqual(simple_cron._pointer_to_index((0, 0, 0, 0)), 0)
+        self.assertEqual(simple_cron._pointer_to_index((0, 0, 1, 5)), 65)
+        self.assertEqual(simple_cron._pointer_to_index((6, 23, 59, 59)), 7 * 24 * 60 * 60 - 1)
+        self.assertEqual(simple_cron._index_to_pointer(7 * 24 * 60 * 60 - 1), (6, 23, 59, 59))
+        self.assertEqual(simple_cron._index_to_pointer(65), (0, 0, 1, 5))
+
+    def test_get_next_pointer(self):
+        callback = lambda *a, **k: None
+        simple_cron = SimpleCRON()
+        simple_cron_tree = SimpleCRON()
+        simple_cron_tree.COMPILED_INDEX_MAX_SIZE = 0
+        for cron in (simple_cron, simple_cron_tree):
+            cron.add('a', callback, seconds=range(0, 59, 15), minutes=[0, 30], hours=[1, 12])
+            cron.add('b', callback, seconds=5, minutes=range(0, 59, 7), weekdays=[0, 6])
+            cron.add('c', callback, seconds=0, minutes=0, hours=SimpleCRON.WILDCARD_VALUE, weekdays=3)
+        instants = simple_cron._get_compiled_index()[1]
+        self.assertTrue(instants is not None)
+        self.assertEqual(list(instants), sorted(instants))
+
+        pointer = (6, 23, 59, 59)
+        for i in range(len(instants) + 2):
+            next_pointer = simple_cron.get_next_pointer(*pointer)
+            self.assertEqual(next_pointer, simple_cron_tree.get_next_pointer(*pointer))
+            pointer = next_pointer
+
+        # The index is rebuilt after a change of the time table.
+        simple_cron.remove('b')
+        self.assertEqual(simple_cron.get_next_pointer(0, 0, 0, 0), (0, 1, 0, 0))
+        simple_cron.COMPILED_INDEX_MAX_SIZE = 10
+        simple_cron.add('d', callback, seconds=30)
+        self.assertEqual(simple_cron._get_compiled_index()[1], None)
+        self.assertEqual(simple_cron.get_next_pointer(0, 0, 0, 0), (0, 0, 0, 30))
+
+    def test_run_callbacks(self):
+        OUT = []
+
+        def callback(scorn_instance, callback_name, pointer, memory):
+            OUT.append((callback_name, pointer))
+            memory['calls'] = memory.get('calls', 0) + 1
+
+        simple_cron = SimpleCRON()
+        simple_cron.add('a', callback, seconds=[0, 30], minutes=5)
+        simple_cron.add('b', run_times(1)(callback), seconds=30, minutes=5, hours=1)
+        groups = simple_cron._get_compiled_index()[3]
+
+        simple_cron.run_callbacks(0, 1, 5, 30)
+        self.assertEqual(OUT, [('a', (0, 1, 5, 30)), ('b', (0, 1, 5, 30))])
+        self.assertEqual(simple_cron.callbacks_memory['a']['calls'], 1)
+        # "b" removed itself, so the dispatch lists are compiled again.
+        self.assertFalse(simple_cron._get_compiled_index()[3] is groups)
+        del OUT[:]
+
+        groups = simple_cron._get_compiled_index()[3]
+        simple_cron.run_callbacks(0, 1, 5, 30)
+        simple_cron.run_callbacks(0, 1, 5, 31)
+        self.assertEqual(OUT, [('a', (0, 1, 5, 30))])
+        self.assertTrue(simple_cron._get_compiled_index()[3] is groups)
+
+    def test_run_callbacks__overlapping_entries(self):
+        OUT = []
+
+        def callback(scorn_instance, callback_name, pointer, memory):
+            OUT.append(callback_name)
+
+        simple_cron_tree = SimpleCRON()
+        simple_cron_tree.COMPILED_INDEX_MAX_SIZE = 0
+        crons = (SimpleCRON(), simple_cron_tree, SimpleCRON(time_table_engine=BitmaskTimeTable),
+                 SimpleCRON(time_table_engine=CompactTimeTable))
+        for cron in crons:
+            del OUT[:]
+            # The entries of "a" share the calls at 0:00:05 and 1:00:05 of Monday.
+            cron.add('a', callback, seconds=5, minutes=0, hours=[0, 1], weekdays=0)
+            cron.add('a', callback, seconds=5, minutes=0, hours=SimpleCRON.WILDCARD_VALUE, weekdays=0)
+            cron.add('b', callback, seconds=[5, 5], minutes=0, hours=0, weekdays=0)
+            cron.run_callbacks(0, 0, 0, 5)
+            cron.run_callbacks(0, 1, 0, 5)
+            cron.run_callbacks(0, 2, 0, 5)
+            self.assertEqual(sorted(OUT), ['a', 'a', 'a', 'b'])
+        self.assertTrue(crons[0]._get_compiled_index()[1] is not None)
+        self.assertTrue(simple_cron_tree._get_compiled_index()[1] is None)
+
+    def test_iter_fire_times(self):
+        callback = lambda *a, **k: None
+        simple_cron_tree = SimpleCRON()
+        simple_cron_tree.COMPILED_INDEX_MAX_SIZE = 0
+        crons = (SimpleCRON(), simple_cron_tree, SimpleCRON(time_table_engine=BitmaskTimeTable),
+                 SimpleCRON(time_table_engine=CompactTimeTable))
+        for cron in crons:
+            self.assertEqual(list(cron.iter_fire_times((0, 0, 0, 0), 10)), [])
+            cron.add('a', callback, seconds=range(0, 59, 15), minutes=[0, 30], hours=[1, 12])
+            cron.add('b', callback, seconds=5, minutes=range(0, 59, 7), weekdays=[0, 6])
+            cron.add('c', callback, seconds=0, minutes=0, hours=SimpleCRON.WILDCARD_VALUE, weekdays=3)
+            cron.add('d', callback, seconds=0, minutes=0, hours=12, weekdays=3)
+
+        # The steps with wildcards are expanded.
+        steps = {}
+        for step in simple_cron_tree.list():
+            pointers = [()]
+            for value, limit in zip(step[:-1], SimpleCRON.TIME_TABLE_KEYS.values()):
+                values = range(limit + 1) if value == SimpleCRON.WILDCARD_VALUE else (value,)
+                pointers = [pointer + (value,) for pointer in pointers for value in values]
+            for pointer in pointers:
+                steps[pointer] = steps.get(pointer, set()).union(step[-1])
+        steps = [(pointer, tuple(sorted(steps[pointer]))) for pointer in sorted(steps)]
+        for cron in crons:
+            self.assertEqual(list(cron.iter_fire_times((0, 0, 0, 0), 0)), [])
+            # Three counter cycles, the start pointer is not included.
+            fire_times = list(cron.iter_fire_times(steps[0][0], 3 * len(steps)))
+            self.assertEqual(fire_times[:len(steps) - 1], steps[1:])
+            self.assertEqual(fire_times[len(steps) - 1], steps[0])
+            self.assertEqual(fire_times[len(steps):2 * len(steps)], steps[1:] + steps[:1])
+
+            pointer = (3, 11, 59, 59)
+            for next_pointer, callback_names in cron.iter_fire_times(pointer, 20):
+                self.assertEqual(next_pointer, cron.get_next_pointer(*pointer))
+                pointer = next_pointer
+
+            self.assertEqual(list(cron.iter_fire_times((3, 11, 0, 0), (3, 12, 0, 0))),
+                             [((3, 12, 0, 0), ('a', 'c', 'd'))])
+            self.assertEqual(list(cron.iter_fire_times((3, 10, 59, 59), (3, 12, 0, 0))),
+                             [((3, 11, 0, 0), ('c',)), ((3, 12, 0, 0), ('a', 'c', 'd'))])
+            # Until the end of the week and around it.
+            self.assertEqual(list(cron.iter_fire_times((6, 23, 0, 0), (0, 1, 0, 0))),
+                             [((6, 23, 0, 5), ('b',))] + [((6, 23, minute, 5), ('b',)) for minute in range(7, 59, 7)] +
+                             [((0, 0, minute, 5), ('b',)) for minute in range(0, 59, 7)] +
+                             [((0, 1, 0, 0), ('a',))])
+            # The same until pointer means the full cycle.
+            self.assertEqual(len(list(cron.iter_fire_times((0, 0, 0, 0), (0, 0, 0, 0)))), len(steps))
+
+
+class FakeTimer:
+
+    def __init__(self):
+        self.deinit_calls = 0
+        self.init_calls = []
+
+    def deinit(self):
+        self.deinit_calls += 1
+
+    def init(self, **kwargs):
+        self.init_calls.append(kwargs)
+
+
+class TestBatch(unittest.TestCase):
+
+    def setUp(self):
+        self.simple_cron = SimpleCRON()
+        self.simple_cron.timer = FakeTimer()
+        self.simple_cron.get_current_pointer = lambda: (0, 0, 0, 0)
+        self.steps = []
+        self.simple_cron.next_step = lambda *pointer: lambda timer: self.steps.append(pointer)
+
+    def test_batch(self):
+        callback = lambda *a, **k: None
+        with self.simple_cron.batch():
+            self.simple_cron.add('a', callback, seconds=10)
+            self.simple_cron.add('b', callback, seconds=5)
+            with self.simple_cron.batch():
+                self.simple_cron.add('c', callback, seconds=20)
+            self.assertEqual(self.simple_cron.timer.deinit_calls, 0)
+        self.assertEqual(self.simple_cron.timer.deinit_calls, 1)
+        self.assertEqual(self.steps, [(0, 0, 0, 5)])
+
+    def test_remove_all(self):
+        callback = lambda *a, **k: None
+        with self.simple_cron.batch():
+            for i in range(10):
+                self.simple_cron.add(str(i), callback, seconds=i)
+        self.simple_cron.remove_all()
+        self.assertEqual(self.simple_cron.timer.deinit_calls, 2)
+        self.assertEqual(self.simple_cron.callbacks, {})
+
+    def test_add_many(self):
+        callback = lambda *a, **k: None
+        self.simple_cron.add_many([
+            {'callback_name': 'a', 'callback': callback, 'seconds': 10},
+            ('b', callback, 5),
+        ])
+        self.assertEqual(self.simple_cron.timer.deinit_calls, 1)
+        self.assertEqual(sorted(self.simple_cron.callbacks), ['a', 'b'])
+
+        with self.assertRaises(ValueError):
+            self.simple_cron.add_many([
+                {'callback_name': 'c', 'callback': callback, 'seconds': 10},
+                {'callback_name': 'd', 'callback': callback, 'seconds': 60},
+            ])
+        self.assertEqual(sorted(self.simple_cron.callbacks), ['a', 'b'])
+
+
+class TestNextStep(unittest.TestCase):
+
+    def setUp(self):
+        self.OUT = []
+        self.current_pointer = (0, 0, 0, 0)
+        self.simple_cron = self.get_simple_cron()
+        self.timer = FakeTimer()
+
+    def get_simple_cron(self, time_table_engine=None):
+        simple_cron = SimpleCRON(time_table_engine=time_table_engine)
+        simple_cron.time_change = 0
+        simple_cron._get_time_change_pointer = lambda: 5000
+        simple_cron.get_current_pointer = lambda: self.current_pointer
+        return simple_cron
+
+    def callback(self, scorn_instance, callback_name, pointer, memory):
+        self.OUT.append((callback_name, pointer))
+
+    def test_get_steps_to_next_pointer(self):
+        self.assertEqual(self.simple_cron.get_steps_to_next_pointer(0, 0, 0, 0), None)
+        self.simple_cron.add('a', self.callback, seconds=10, minutes=0, hours=0, weekdays=0)
+        self.assertEqual(self.simple_cron.get_steps_to_next_pointer(0, 0, 0, 0), 10)
+        self.assertEqual(self.simple_cron.get_steps_to_next_pointer(6, 23, 59, 59), 11)
+        self.assertEqual(self.simple_cron.get_steps_to_next_pointer(0, 0, 0, 10), 7 * 24 * 60 * 60)
+
+    def test_next_step(self):
+        self.simple_cron.add('a', self.callback, seconds=10)
+        # The first step does not run the callbacks.
+        self.simple_cron.next_step(0, 0, 0, 10)(self.timer)
+        self.assertEqual(self.OUT, [])
+        self.assertEqual(self.timer.init_calls[-1]['period'], 10000)
+        self.assertEqual(self.simple_cron.deadline, ((0, 0, 0, 10), 15000))
+
+        self.current_pointer = (0, 0, 0, 10)
+        self.timer.init_calls[-1]['callback'](self.timer)
+        self.assertEqual(self.OUT, [('a', (0, 0, 0, 10))])
+        self.assertEqual(self.timer.init_calls[-1]['period'], 60000)
+        self.assertEqual(self.simple_cron.deadline, ((0, 0, 1, 10), 65000))
+        # The timer gets the same bound method on each step.
+        self.assertTrue(self.timer.init_calls[0]['callback'] is self.timer.init_calls[-1]['callback'])
+        self.assertTrue(self.simple_cron.next_step(0, 0, 1, 10) is self.timer.init_calls[0]['callback'])
+
+        # The callback removes itself and the timer is set again, during the step.
+        def remove_a(scorn_instance, callback_name, pointer, memory):
+            scorn_instance.remove('a')
+
+        self.current_pointer = (0, 0, 1, 0)
+        self.simple_cron.timer = self.timer
+        self.simple_cron.add('a', remove_a, seconds=10)
+        self.simple_cron.add('b', self.callback, seconds=30)
+        self.current_pointer = (0, 0, 1, 10)
+        self.timer.init_calls[-1]['callback'](self.timer)
+        self.assertEqual(self.simple_cron.deadline, ((0, 0, 1, 30), 25000))
+        self.current_pointer = (0, 0, 1, 30)
+        self.timer.init_calls[-1]['callback'](self.timer)
+        self.assertEqual(self.OUT, [('a', (0, 0, 0, 10)), ('b', (0, 0, 1, 30))])
+
+    def test_next_step__deferred(self):
+        # The engines are changed in place, so they are read under the lock.
+        self.simple_cron = self.get_simple_cron(BitmaskTimeTable)
+        self.simple_cron.add('a', self.callback, seconds=10)
+        self.simple_cron.add('b', self.callback, seconds=20)
+        self.simple_cron.next_step(0, 0, 0, 10)(self.timer)
+
+        # The timer interrupts the removal of a callback.
+        self.current_pointer = (0, 0, 0, 10)
+        self.simple_cron._lock_rw.acquire()
+        self.timer.init_calls[-1]['callback'](self.timer)
+        self.assertEqual(self.OUT, [])
+        self.assertEqual(len(self.timer.init_calls), 1)
+        with self.assertRaises(Exception):
+            self.simple_cron.get_next_pointer(0, 0, 0, 0)
+        with self.assertRaises(Exception):
+            self.simple_cron.remove('a')
+
+        # The step is run after the change.
+        self.simple_cron._lock_rw.release()
+        self.assertEqual(self.OUT, [('a', (0, 0, 0, 10))])
+        self.assertEqual(self.simple_cron.deadline, ((0, 0, 0, 20), 15000))
+        self.assertEqual(self.simple_cron._lock_rw.deferred, [])
+
+    def test_next_step__deferred_tree(self):
+        # The tree is read without the lock, but the callbacks can change it.
+        self.simple_cron.add('a', run_times(1)(self.callback), seconds=10)
+        self.simple_cron.add('b', self.callback, seconds=20)
+        self.simple_cron.next_step(0, 0, 0, 10)(self.timer)
+
+        # The timer interrupts the removal of a callback.
+        self.current_pointer = (0, 0, 0, 10)
+        self.simple_cron._lock_rw.acquire()
+        self.timer.init_calls[-1]['callback'](self.timer)
+        self.assertEqual(self.OUT, [])
+
+        # The step is run after the change, and "a" removes itself.
+        self.simple_cron._lock_rw.release()
+        self.assertEqual(self.OUT, [('a', (0, 0, 0, 10))])
+        self.assertFalse(self.simple_cron.callback_exists('a'))
+        self.assertEqual(self.simple_cron.deadline[0], (0, 0, 0, 20))
+        self.assertEqual(self.simple_cron._lock_rw.deferred, [])
+
+    def test_lock__thread(self):
+        import _thread
+        import utime
+        self.simple_cron = self.get_simple_cron(BitmaskTimeTable)
+        self.simple_cron.add('a', self.callback, seconds=10)
+        self.simple_cron._lock_rw.acquire()
+        OUT = []
+        done = _thread.allocate_lock()
+        done.acquire()
+
+        def reader():
+            OUT.append(self.simple_cron.get_next_pointer(0, 0, 0, 0))
+            done.release()
+
+        _thread.start_new_thread(reader, ())
+        utime.sleep_ms(50)
+        # The reader of another thread waits for the writer.
+        self.assertEqual(OUT, [])
+        self.simple_cron._lock_rw.release()
+        done.acquire()
+        self.assertEqual(OUT, [(0, 0, 0, 10)])
+
+    def test_next_step__copy_on_write(self):
+        self.simple_cron.add('a', self.callback, seconds=10)
+        self.simple_cron.add('b', self.callback, seconds=20)
+        self.simple_cron.next_step(0, 0, 0, 10)(self.timer)
+
+        # During the removal of a callback, the published time table is read without waiting,
+        # but the timer step is deferred, because the callbacks can change the time table.
+        self.current_pointer = (0, 0, 0, 10)
+        self.simple_cron._lock_rw.acquire()
+        self.assertEqual(self.simple_cron.get_next_pointer(0, 0, 0, 10), (0, 0, 0, 20))
+        self.timer.init_calls[-1]['callback'](self.timer)
+        self.assertEqual(self.OUT, [])
+        self.simple_cron._lock_rw.release()
+        self.assertEqual(self.OUT, [('a', (0, 0, 0, 10))])
+        self.assertEqual(self.simple_cron.deadline, ((0, 0, 0, 20), 15000))
+
+    def test_run_callbacks__changed_during_call(self):
+        def add_c(scorn_instance, callback_name, pointer, memory):
+            self.OUT.append((callback_name, pointer))
+            scorn_instance.remove('b')
+            scorn_instance.add('c', self.callback, seconds=10)
+
+        for simple_cron in (self.get_simple_cron(), self.get_simple_cron(BitmaskTimeTable)):
+            simple_cron.COMPILED_INDEX_MAX_SIZE = 0
+            del self.OUT[:]
+            simple_cron.add('a', add_c, seconds=10, minutes=0, hours=0, weekdays=0)
+            simple_cron.add('b', self.callback, seconds=10, minutes=0, hours=0, weekdays=0)
+            simple_cron.run_callbacks(0, 0, 0, 10)
+            # "b" is run only if it is called before "a", "c" is added after the dispatch list is made.
+            self.assertTrue(('a', (0, 0, 0, 10)) in self.OUT)
+            self.assertFalse(('c', (0, 0, 0, 10)) in self.OUT)
+            del self.OUT[:]
+            simple_cron.run_callbacks(0, 0, 0, 10)
+            self.assertEqual(sorted(self.OUT), [('a', (0, 0, 0, 10)), ('c', (0, 0, 0, 10))])
+
+    def test_run_callbacks__removed_during_call(self):
+        def remove_all(scorn_instance, callback_name, pointer, memory):
+            self.OUT.append((callback_name, pointer))
+            scorn_instance.remove_all(force=True)
+
+        simple_cron_tree = SimpleCRON()
+        simple_cron_tree.COMPILED_INDEX_MAX_SIZE = 0
+        for simple_cron in (SimpleCRON(), simple_cron_tree, SimpleCRON(time_table_engine=BitmaskTimeTable)):
+            del self.OUT[:]
+            simple_cron.add('a', remove_all, seconds=10, minutes=0, hours=0, weekdays=0)
+            simple_cron.add('b', remove_all, seconds=10, minutes=0, hours=0, weekdays=0)
+            simple_cron.run_callbacks(0, 0, 0, 10)
+            self.assertEqual(len(self.OUT), 1)
+            self.assertEqual(list(simple_cron.list()), [])
+
+    def test_compile__removed_during_compile(self):
+        exceptions = []
+        self.simple_cron.callback_exception_processors = [exceptions.append]
+        self.simple_cron.add('a', self.callback, seconds=10, minutes=0, hours=0, weekdays=0)
+        self.simple_cron.add('b', self.callback, seconds=10, minutes=0, hours=0, weekdays=0)
+        # Another thread has removed "b" from the callbacks, but not from the time table yet.
+        del self.simple_cron.callbacks['b']
+        del self.simple_cron.callbacks_memory['b']
+        compiled_index = self.simple_cron._get_compiled_index()
+        self.assertEqual(compiled_index[0], self.simple_cron._generation)
+        self.assertEqual([group[0] for group in compiled_index[3][0]], ['a'])
+        self.simple_cron.run_callbacks(0, 0, 0, 10)
+        self.assertEqual(self.OUT, [('a', (0, 0, 0, 10))])
+        self.assertEqual(exceptions, [])
+
+    def test_next_step__next_week(self):
+        self.simple_cron.add('a', self.callback, seconds=5, minutes=0, hours=0, weekdays=0)
+        self.current_pointer = (6, 23, 59, 50)
+        self.simple_cron.next_step(0, 0, 0, 5)(self.timer)
+        self.assertEqual(self.timer.init_calls[-1]['period'], 15000)
+        self.assertEqual(self.OUT, [])
+
+
+class TestChangesDuringRun(unittest.TestCase):
+
+    def setUp(self):
+        self.OUT = []
+        self.simple_cron = SimpleCRON()
+        self.simple_cron.timer = FakeTimer()
+        self.simple_cron.get_current_pointer = lambda: (0, 0, 0, 0)
+        self.steps = []
+        self.simple_cron.next_step = lambda *pointer: lambda timer: self.steps.append(pointer)
+
+    def callback(self, scorn_instance, callback_name, pointer, memory):
+        self.OUT.append(callback_name)
+
+    def remove_b(self, scorn_instance, callback_name, pointer, memory):
+        self.OUT.append(callback_name)
+        scorn_instance.remove('b')
+
+    def test_single_reschedule(self):
+        for callback_name in ('a', 'b', 'c'):
+            self.simple_cron.add(callback_name, run_times(1)(self.callback), seconds=10)
+        self.simple_cron.add('d', self.callback, seconds=20)
+        del self.steps[:]
+        deinit_calls = self.simple_cron.timer.deinit_calls
+
+        self.simple_cron.run_callbacks(0, 0, 0, 10)
+        self.assertEqual(sorted(self.OUT), ['a', 'b', 'c'])
+        self.assertEqual(list(self.simple_cron.list()), [(-1, -1, -1, 20, {'d'})])
+        # The timer is set once, after all callbacks.
+        self.assertEqual(self.simple_cron.timer.deinit_calls, deinit_calls + 1)
+        self.assertEqual(self.steps, [(0, 0, 0, 20)])
+
+    def test_queue_changes(self):
+        self.simple_cron.QUEUE_CHANGES = True
+        self.simple_cron.add('a', self.remove_b, seconds=10)
+        self.simple_cron.add('b', self.callback, seconds=10, removable=False)
+        self.simple_cron.add('c', run_times(1)(self.callback), seconds=10)
+        self.simple_cron.add('d', lambda *args: self.simple_cron.add('e', self.callback, seconds=30), seconds=10)
+        del self.steps[:]
+        exceptions = []
+        self.simple_cron.callback_exception_processors = [exceptions.append]
+
+        self.simple_cron.run_callbacks(0, 0, 0, 10)
+        # The changes are applied after all callbacks.
+        self.assertEqual(sorted(self.OUT), ['a', 'b', 'c'])
+        self.assertEqual(len(exceptions), 1)
+        self.assertEqual(sorted(self.simple_cron.callbacks.keys()), ['a', 'b', 'd', 'e'])
+        self.assertEqual(self.simple_cron._changes_queue, None)
+        self.assertEqual(self.steps, [(0, 0, 0, 10)])
+
+        # Outside of the run of callbacks the changes are made at once.
+        self.simple_cron.remove('e')
+        self.assertFalse(self.simple_cron.callback_exists('e'))
+
+
+class TestRunAsync(unittest.TestCase):
+    # One second of the counter lasts 50 ms.
+    STEP_MS = 50
+
+    def setUp(self):
+        import time
+        self.OUT = []
+        self.start = time.time()
+        self.simple_cron = SimpleCRON()
+
+        async def estimate_time_change():
+            return 0
+
+        self.simple_cron._estimate_time_change_async = estimate_time_change
+        self.simple_cron._get_time_change_pointer = lambda: int((time.time() - self.start) * 1000)
+        self.simple_cron._get_time_change_correction = \
+            lambda delta_time_ms, time_change_pointer=None: delta_time_ms * self.STEP_MS // 1000
+        self.simple_cron.get_current_pointer = \
+            lambda: self.simple_cron._index_to_pointer(int((time.time() - self.start) * 1000) // self.STEP_MS)
+
+    def callback(self, scorn_instance, callback_name, pointer, memory):
+        self.OUT.append((callback_name, pointer))
+
+    def test_run_async(self):
+        try:
+            import asyncio
+        except ImportError:
+            import uasyncio as asyncio
+
+        async def wait_for_calls(calls):
+            for i in range(100):
+                if len(self.OUT) >= calls:
+                    return
+                await asyncio.sleep(self.STEP_MS / 1000)
+
+        async def main():
+            self.simple_cron.add('a', self.callback, seconds=[4, 12], minutes=0)
+            task = asyncio.create_task(self.simple_cron.run_async())
+            await wait_for_calls(1)
+            self.assertEqual(self.OUT, [('a', (0, 0, 0, 4))])
+            self.assertEqual(self.simple_cron.deadline[0], (0, 0, 0, 12))
+            # The driver wakes up after a change of the time table.
+            self.simple_cron.add('b', self.callback, seconds=9, minutes=0)
+            await wait_for_calls(3)
+            self.assertEqual(self.OUT, [('a', (0, 0, 0, 4)), ('b', (0, 0, 0, 9)), ('a', (0, 0, 0, 12))])
+            with self.assertRaises(Exception):
+                self.simple_cron.run()
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+            self.assertEqual(self.simple_cron._wakeup, None)
+
+        asyncio.run(main())
+
+    def test_run_async__changed_by_slow_callback(self):
+        import time
+        try:
+            import asyncio
+        except ImportError:
+            import uasyncio as asyncio
+        # Longer seconds leave more time for a late wake-up.
+        self.STEP_MS = 100
+
+        async def estimate_time_change():
+            # The clock starts with the driver.
+            self.start = time.time()
+            return 0
+
+        self.simple_cron._estimate_time_change_async = estimate_time_change
+        # The seconds of the clock start 60 ms before the deadlines, the timer is not aligned with the clock.
+        self.simple_cron.get_current_pointer = \
+            lambda: self.simple_cron._index_to_pointer((int((time.time() - self.start) * 1000) + 60) // self.STEP_MS)
+
+        def add_c(scorn_instance, callback_name, pointer, memory):
+            self.callback(scorn_instance, callback_name, pointer, memory)
+            scorn_instance.add('c', self.callback, seconds=7, minutes=0)
+            # The clock goes past the second of "b" during the call, before the deadline of "b".
+            time.sleep(self.STEP_MS * 0.6 / 1000)
+
+        async def wait_for_calls(calls):
+            for i in range(100):
+                if len(self.OUT) >= calls:
+                    return
+                await asyncio.sleep(self.STEP_MS / 1000)
+
+        async def main():
+            self.simple_cron.add('a', add_c, seconds=4, minutes=0)
+            self.simple_cron.add('b', self.callback, seconds=5, minutes=0)
+            task = asyncio.create_task(self.simple_cron.run_async())
+            await wait_for_calls(3)
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+            # The change made by "a" does not skip the pending call of "b".
+            self.assertEqual(self.OUT, [('a', (0, 0, 0, 4)), ('b', (0, 0, 0, 5)), ('c', (0, 0, 0, 7))])
+
+        asyncio.run(main())
+
+    def test_estimate_time_change_async(self):
+        try:
+            import asyncio
+        except ImportError:
+            import uasyncio as asyncio
+        simple_cron = SimpleCRON()
+        pings = []
+
+        async def ping():
+            while True:
+                pings.append(1)
+                await asyncio.sleep(0.05)
+
+        async def main():
+            task = asyncio.create_task(ping())
+            time_change = await simple_cron._estimate_time_change_async()
+            task.cancel()
+            return time_change
+
+        # The estimation lasts 1-2 s, the other tasks run at the same time.
+        time_change = asyncio.run(main())
+        self.assertTrue(0 <= time_change < 1000)
+        self.assertTrue(len(pings) >= 10, msg=len(pings))
+
+    def test_coroutine_callbacks(self):
+        try:
+            import asyncio
+        except ImportError:
+            import uasyncio as asyncio
+        running = []
+        exceptions = []
+        self.simple_cron.callback_exception_processors = [exceptions.append]
+
+        async def callback(scorn_instance, callback_name, pointer, memory):
+            running.append(callback_name)
+            self.OUT.append(len(running))
+            await asyncio.sleep(0.01)
+            running.remove(callback_name)
+            if callback_name == 'c':
+                raise Exception('c')
+
+        for callback_name in ('a', 'b', 'c'):
+            self.simple_cron.add(callback_name, callback, seconds=10, minutes=0, hours=0, weekdays=0)
+
+        # Coroutines need the event loop of run_async().
+        self.simple_cron.run_callbacks(0, 0, 0, 10)
+        self.assertEqual(len(exceptions), 3)
+        del exceptions[:]
+
+        async def main():
+            self.simple_cron.COROUTINES_LIMIT = 2
+            self.simple_cron._wakeup = asyncio.Event()
+            self.simple_cron.run_callbacks(0, 0, 0, 10)
+            self.assertEqual(self.simple_cron._coroutines_running, 2)
+            self.assertEqual(len(self.simple_cron._coroutines_pending), 1)
+            for i in range(100):
+                await asyncio.sleep(0.01)
+                if self.simple_cron._coroutines_running == 0:
+                    break
+            self.simple_cron._wakeup = None
+
+        asyncio.run(main())
+        # All coroutines have been run, at most 2 at the same time.
+        self.assertEqual(len(self.OUT), 3)
+        self.assertEqual(max(self.OUT), 2)
+        self.assertEqual(len(exceptions), 1)
+        self.assertEqual(self.simple_cron._coroutines_pending, [])
+
+
+class TestThreadPoolExecutor(unittest.TestCase):
+
+    def setUp(self):
+        import _thread
+        from scron.executor import ThreadPoolExecutor
+        self.executor = ThreadPoolExecutor(workers=2, queue_size=2)
+        self.job_lock = _thread.allocate_lock()
+        self.job_lock.acquire()
+        self.OUT = []
+
+    def tearDown(self):
+        self.executor.shutdown()
+
+    def job(self, name):
+        self.job_lock.acquire()
+        self.job_lock.release()
+        self.OUT.append(name)
+
+    def wait_for(self, condition):
+        import utime
+        for i in range(200):
+            if condition():
+                return
+            utime.sleep_ms(5)
+
+    def test_submit(self):
+        for name in ('a', 'b'):
+            self.assertTrue(self.executor.submit(self.job, name))
+        self.wait_for(lambda: self.executor.stats()['busy'] == 2)
+        for name in ('c', 'd'):
+            self.assertTrue(self.executor.submit(self.job, name))
+        self.assertFalse(self.executor.submit(self.job, 'e'))
+        stats = self.executor.stats()
+        self.assertEqual(stats['busy'], 2)
+        self.assertEqual(stats['queue_depth'], 2)
+        self.assertEqual(stats['rejected'], 1)
+
+        self.job_lock.release()
+        self.wait_for(lambda: self.executor.stats()['completed'] == 4)
+        self.assertEqual(sorted(self.OUT), ['a', 'b', 'c', 'd'])
+        stats = self.executor.stats()
+        self.assertEqual(stats['busy'], 0)
+        self.assertEqual(stats['queue_depth'], 0)
+        self.assertEqual(stats['max_queue_depth'], 2)
+        self.assertEqual(stats['submitted'], 4)
+
+    def test_simple_cron(self):
+        exceptions = []
+
+        def callback(scorn_instance, callback_name, pointer, memory):
+            self.job(callback_name)
+            if callback_name == 'b':
+                raise Exception('b')
+
+        from scron.executor import ThreadPoolExecutor
+        self.executor.shutdown()
+        self.executor = ThreadPoolExecutor(workers=2, queue_size=16)
+        simple_cron = SimpleCRON(executor=self.executor)
+        simple_cron.callback_exception_processors = [exceptions.append]
+        for callback_name in ('a', 'b', 'c', 'd', 'e'):
+            simple_cron.add(callback_name, callback, seconds=10)
+
+        # The callbacks wait for the job lock in the workers.
+        simple_cron.run_callbacks(0, 0, 0, 10)
+        self.assertEqual(self.OUT, [])
+        self.assertEqual(exceptions, [])
+
+        self.job_lock.release()
+        self.wait_for(lambda: self.executor.stats()['completed'] == 5)
+        self.assertEqual(sorted(self.OUT), ['a', 'b', 'c', 'd', 'e'])
+        self.assertEqual(len(exceptions), 1)
+
+        # The callback is skipped if the queue is full.
+        self.executor.queue_size = 0
+        simple_cron.run_callbacks(0, 0, 0, 10)
+        self.assertEqual(len(exceptions), 6)
+
+
+class TestStats(unittest.TestCase):
+
+    def setUp(self):
+        self.simple_cron = SimpleCRON()
+        self.simple_cron.STATS = True
+
+    def test_stats_off(self):
+        def callback(scorn_instance, callback_name, pointer, memory):
+            pass
+
+        simple_cron = SimpleCRON()
+        simple_cron.add('a', callback, seconds=10)
+        simple_cron.run_callbacks(0, 0, 0, 10)
+        # Nothing is measured and allocated by default.
+        self.assertEqual(list(simple_cron.callbacks_memory['a'].keys()), [])
+        self.assertEqual(simple_cron.stats()['callbacks']['a']['runs'], 0)
+
+    def test_callback_timing(self):
+        import utime
+
+        def callback(scorn_instance, callback_name, pointer, memory):
+            if callback_name == 'slow':
+                utime.sleep_ms(5)
+
+        self.simple_cron.add('slow', callback, seconds=10)
+        self.simple_cron.add('fast', callback, seconds=10)
+        self.simple_cron.add('idle', callback, seconds=20)
+        self.simple_cron.run_callbacks(0, 0, 0, 10)
+        timing = self.simple_cron.callbacks_memory['slow'][SimpleCRON.TIMING_ID]
+        self.simple_cron.run_callbacks(0, 0, 0, 10)
+        # The timing array is created once.
+        self.assertTrue(self.simple_cron.callbacks_memory['slow'][SimpleCRON.TIMING_ID] is timing)
+
+        stats = self.simple_cron.stats()['callbacks']
+        self.assertEqual(sorted(stats.keys()), ['fast', 'idle', 'slow'])
+        self.assertEqual(stats['slow']['runs'], 2)
+        self.assertTrue(stats['slow']['max_us'] >= 5000)
+        self.assertTrue(stats['slow']['last_us'] >= 5000)
+        self.assertTrue(stats['fast']['max_us'] < stats['slow']['last_us'])
+        self.assertEqual(len(stats['slow']['histogram']), SimpleCRON.TIMING_BUCKETS)
+        self.assertEqual(sum(stats['slow']['histogram']), 2)
+        self.assertEqual(stats['idle']['runs'], 0)
+        self.assertEqual(list(self.simple_cron.stats('fast')['callbacks'].keys()), ['fast'])
+
+    def test_timing_histogram(self):
+        memory = {}
+        for duration_us in (0, 1, 2, 3, 4, 1000, 1023, 1024, 1 << 30):
+            self.simple_cron._record_timing(memory, duration_us)
+        timing = memory[SimpleCRON.TIMING_ID]
+        self.assertEqual(timing[SimpleCRON.TIMING_RUNS], 9)
+        self.assertEqual(timing[SimpleCRON.TIMING_LAST], 1 << 30)
+        self.assertEqual(timing[SimpleCRON.TIMING_MAX], 1 << 30)
+        histogram = list(timing[SimpleCRON.TIMING_HISTOGRAM:])
+        expected = [0] * SimpleCRON.TIMING_BUCKETS
+        expected[0] = 2
+        expected[1] = 2
+        expected[2] = 1
+        expected[9] = 2
+        expected[10] = 1
+        expected[-1] = 1
+        self.assertEqual(histogram, expected)
+
+    def test_lateness(self):
+        now = [5000]
+        current_pointer = [(0, 0, 0, 0)]
+        timer = FakeTimer()
+        simple_cron = self.simple_cron
+        simple_cron.time_change = 0
+        simple_cron._get_time_change_pointer = lambda: now[0]
+        simple_cron.get_current_pointer = lambda: current_pointer[0]
+
+        def callback(scorn_instance, callback_name, pointer, memory):
+            # Each call lasts 30 ms.
+            now[0] += 30
+
+        simple_cron.add('a', callback, seconds=10)
+        simple_cron.add('b', callback, seconds=10)
+        # The first step is not planned.
+        simple_cron.next_step(0, 0, 0, 10)(timer)
+        self.assertEqual(simple_cron.stats()['wake_lateness']['count'], 0)
+        self.assertEqual(simple_cron.deadline, ((0, 0, 0, 10), 15000))
+
+        # The timer wakes up 20 ms late, the second callback starts after the first one.
+        now[0] = 15020
+        current_pointer[0] = (0, 0, 0, 10)
+        timer.init_calls[-1]['callback'](timer)
+        stats = simple_cron.stats()
+        wake_lateness = stats['wake_lateness']
+        self.assertEqual((wake_lateness['count'], wake_lateness['min_ms'], wake_lateness['max_ms']), (1, 20, 20))
+        self.assertEqual(wake_lateness['histogram'][5], 1)
+        self.assertEqual(
+            sorted([stats['callbacks'][callback_name]['lateness']['max_ms'] for callback_name in ('a', 'b')]),
+            [20, 50]
+        )
+
+        # The timer wakes up 5 ms early.
+        now[0] = simple_cron.deadline[1] - 5
+        current_pointer[0] = (0, 0, 1, 9)
+        timer.init_calls[-1]['callback'](timer)
+        wake_lateness = simple_cron.stats()['wake_lateness']
+        self.assertEqual((wake_lateness['count'], wake_lateness['min_ms'], wake_lateness['max_ms']), (2, -5, 20))
+        self.assertEqual(wake_lateness['avg_ms'], 7.5)
+        self.assertEqual(wake_lateness['histogram'][0], 1)
+
+        # The early step does not run the callbacks, and the callbacks called outside of the timer step
+        # are not counted.
+        simple_cron.run_callbacks(0, 0, 2, 10)
+        self.assertEqual(simple_cron.stats('a')['callbacks']['a']['lateness']['count'], 1)
+
+        # The timer set again after the changes of the time table is not a wake-up.
+        simple_cron.timer = timer
+        simple_cron.add('c', callback, seconds=30)
+        simple_cron.remove('c')
+        wake_lateness = simple_cron.stats()['wake_lateness']
+        self.assertEqual((wake_lateness['count'], wake_lateness['min_ms'], wake_lateness['max_ms']), (2, -5, 20))
+
+        simple_cron.reset_stats()
+        stats = simple_cron.stats()
+        self.assertEqual(stats['wake_lateness']['count'], 0)
+        self.assertEqual(stats['callbacks']['a']['lateness']['count'], 0)
+        self.assertEqual(stats['callbacks']['a']['runs'], 2)
+
+    def test_lateness_off(self):
+        now = [5000]
+        timer = FakeTimer()
+        simple_cron = SimpleCRON()
+        simple_cron.time_change = 0
+        simple_cron._get_time_change_pointer = lambda: now[0]
+        simple_cron.get_current_pointer = lambda: (0, 0, 0, 10)
+        simple_cron.add('a', lambda *args: None, seconds=10)
+        simple_cron.next_step(0, 0, 0, 10)(timer)
+        now[0] = 15020
+        timer.init_calls[-1]['callback'](timer)
+        # Nothing is recorded and allocated by default.
+        self.assertEqual(simple_cron._wake_lateness, None)
+        self.assertEqual(simple_cron.callbacks_memory['a'], {})
+        self.assertEqual(simple_cron.stats()['wake_lateness']['count'], 0)
+        simple_cron.reset_stats()
+
+    def test_lateness_rolling(self):
+        lateness = self.simple_cron._new_lateness()
+        window = SimpleCRON.LATENESS_WINDOW
+        for i in range(window + 8):
+            self.simple_cron._record_lateness(lateness, 100)
+        for i in range(window + 16):
+            self.simple_cron._record_lateness(lateness, 1)
+        stats = self.simple_cron._lateness_stats(lateness)
+        self.assertEqual((stats['count'], stats['min_ms'], stats['max_ms']), (window * 2 + 24, 1, 100))
+        # The old calls leave the window.
+        for i in range(16):
+            self.simple_cron._record_lateness(lateness, 1)
+        stats = self.simple_cron._lateness_stats(lateness)
+        self.assertEqual((stats['count'], stats['min_ms'], stats['avg_ms'], stats['max_ms']), (window * 2 + 40, 1, 1, 1))
+        self.assertEqual(stats['histogram'][7], window + 8)
+
+    def test_gc_policy(self):
+        simple_cron = self.simple_cron
+
+        def collections():
+            return simple_cron.stats()['gc']['collections']
+
+        # GC_EVERY_TICK: after each change and each step.
+        simple_cron.add('a', lambda *a, **k: None, seconds=10)
+        simple_cron.run_callbacks(0, 0, 0, 10)
+        self.assertEqual(collections(), 2)
+        with simple_cron.batch():
+            simple_cron.add('b', lambda *a, **k: None, seconds=10)
+            simple_cron.add('c', lambda *a, **k: None, seconds=10)
+        self.assertEqual(collections(), 3)
+
+        # The changes made by the callbacks do not add a collection.
+        simple_cron.add('e', run_times(1)(lambda *a, **k: None), seconds=30)
+        self.assertEqual(collections(), 4)
+        simple_cron.run_callbacks(0, 0, 0, 30)
+        self.assertFalse(simple_cron.callback_exists('e'))
+        self.assertEqual(collections(), 5)
+
+        simple_cron.GC_POLICY = SimpleCRON.GC_NEVER
+        simple_cron.add('d', lambda *a, **k: None, seconds=10)
+        simple_cron.run_callbacks(0, 0, 0, 10)
+        self.assertEqual(collections(), 5)
+
+        simple_cron.GC_POLICY = SimpleCRON.GC_EVERY_N_TICKS
+        simple_cron.GC_TICKS = 3
+        simple_cron.remove('d')
+        for i in range(7):
+            simple_cron.run_callbacks(0, 0, 0, 10)
+        self.assertEqual(collections(), 7)
+
+        simple_cron.GC_POLICY = SimpleCRON.GC_THRESHOLD
+        simple_cron._get_mem_free = lambda: SimpleCRON.GC_MEM_FREE_MIN
+        simple_cron.run_callbacks(0, 0, 0, 10)
+        self.assertEqual(collections(), 7)
+        simple_cron._get_mem_free = lambda: SimpleCRON.GC_MEM_FREE_MIN - 1
+        simple_cron.run_callbacks(0, 0, 0, 10)
+        self.assertEqual(collections(), 8)
+
+        gc_stats = simple_cron.stats()['gc']
+        self.assertTrue(gc_stats['max_us'] >= gc_stats['last_us'] > 0)
+        self.assertTrue(gc_stats['total_ms'] * 1000 <= gc_stats['max_us'] * 8)
+
+
+class TestHooks(unittest.TestCase):
+
+    def setUp(self):
+        self.OUT = []
+        self.now = 5000
+        self.current_pointer = (0, 0, 0, 0)
+        self.timer = FakeTimer()
+        self.simple_cron = SimpleCRON()
+        self.simple_cron.time_change = 0
+        self.simple_cron._get_time_change_pointer = lambda: self.now
+        self.simple_cron.get_current_pointer = lambda: self.current_pointer
+
+    def hook(self, event):
+        def hook(scorn_instance, *args):
+            self.assertTrue(scorn_instance is self.simple_cron)
+            self.OUT.append((event,) + args)
+
+        return hook
+
+    def callback(self, scorn_instance, callback_name, pointer, memory):
+        self.OUT.append(('call', callback_name))
+
+    def test_hooks(self):
+        hooks = {}
+        for event in (SimpleCRON.HOOK_BEFORE_TICK, SimpleCRON.HOOK_AFTER_TICK, SimpleCRON.HOOK_BEFORE_CALLBACK,
+                      SimpleCRON.HOOK_AFTER_CALLBACK, SimpleCRON.HOOK_RESCHEDULE):
+            hooks[event] = self.hook(event)
+            self.simple_cron.add_hook(event, hooks[event])
+        with self.assertRaises(Exception):
+            self.simple_cron.add_hook('abc', self.hook('abc'))
+
+        self.simple_cron.add('a', self.callback, seconds=10)
+        self.simple_cron.next_step(0, 0, 0, 10)(self.timer)
+        self.assertEqual(self.OUT, [('reschedule', ((0, 0, 0, 10), 15000))])
+        del self.OUT[:]
+
+        self.now = 15020
+        self.current_pointer = (0, 0, 0, 10)
+        self.timer.init_calls[-1]['callback'](self.timer)
+        # The durations are not known in advance.
+        self.OUT[4] = self.OUT[4][:-1]
+        self.OUT[5] = self.OUT[5][:-1]
+        self.assertEqual(self.OUT, [
+            ('reschedule', ((0, 0, 1, 10), 75000)),
+            ('before_tick', (0, 0, 0, 10)),
+            ('before_callback', 'a', (0, 0, 0, 10), 20),
+            ('call', 'a'),
+            ('after_callback', 'a', (0, 0, 0, 10)),
+            ('after_tick', (0, 0, 0, 10)),
+        ])
+        del self.OUT[:]
+
+        # The callbacks called outside of the timer step have no lateness.
+        self.simple_cron.run_callbacks(0, 0, 2, 10)
+        self.assertEqual(self.OUT[1], ('before_callback', 'a', (0, 0, 2, 10), None))
+        del self.OUT[:]
+
+        for event, hook in hooks.items():
+            self.simple_cron.remove_hook(event, hook)
+        self.simple_cron.run_callbacks(0, 0, 2, 10)
+        self.assertEqual(self.OUT, [('call', 'a')])
+        self.assertEqual(self.simple_cron._hooks_before_callback, ())
+
+    def test_hook_exception(self):
+        exceptions = []
+        self.simple_cron.callback_exception_processors = [exceptions.append]
+
+        def hook(scorn_instance, pointer):
+            raise Exception('abc')
+
+        self.simple_cron.add_hook(SimpleCRON.HOOK_BEFORE_TICK, hook)
+        self.simple_cron.add('a', self.callback, seconds=10)
+        self.simple_cron.run_callbacks(0, 0, 0, 10)
+        self.assertEqual(len(exceptions), 1)
+        self.assertEqual(self.OUT, [('call', 'a')])
+
+
+class TestTrace(unittest.TestCase):
+
+    def setUp(self):
+        self.simple_cron = SimpleCRON()
+
+    def callback(self, scorn_instance, callback_name, pointer, memory):
+        pass
+
+    def test_trace(self):
+        from scron import trace
+        trace_log = trace.Trace(records=4)
+        trace_log.attach(self.simple_cron)
+        self.simple_cron.add('a', self.callback, seconds=10)
+        self.simple_cron.add('b', self.callback, seconds=20)
+        self.simple_cron.run_callbacks(0, 0, 0, 10)
+        records = list(trace.iter_records(trace_log))
+        self.assertEqual([record[1:3] for record in records], [
+            (trace.EVENT_CALLBACK, 'a'),
+            (trace.EVENT_TICK, None),
+        ])
+
+        # The oldest records are overwritten.
+        self.simple_cron.run_callbacks(0, 0, 0, 20)
+        self.simple_cron.run_callbacks(0, 0, 0, 10)
+        records = list(trace.iter_records(trace_log))
+        self.assertEqual([record[1:3] for record in records], [
+            (trace.EVENT_CALLBACK, 'b'),
+            (trace.EVENT_TICK, None),
+            (trace.EVENT_CALLBACK, 'a'),
+            (trace.EVENT_TICK, None),
+        ])
+        self.assertEqual(trace_log.names, ['a', 'b'])
+
+        lines = []
+        trace.dump(trace_log, lines.append)
+        self.assertEqual(len(lines), 4)
+        self.assertTrue(' b ' in lines[0])
+
+        trace_log.detach(self.simple_cron)
+        self.simple_cron.run_callbacks(0, 0, 0, 10)
+        self.assertEqual(trace_log.position, 6)
+        trace_log.clear()
+        self.assertEqual(list(trace.iter_records(trace_log)), [])
+
+    def test_job_ids(self):
+        from scron import trace
+        trace_log = trace.Trace(records=4)
+        trace_log.attach(self.simple_cron)
+        self.simple_cron.add('a', self.callback, seconds=10)
+        self.simple_cron.add('b', self.callback, seconds=10)
+        self.simple_cron.run_callbacks(0, 0, 0, 10)
+        job_id = trace_log.get_job_id('a')
+        self.simple_cron.remove('a')
+        self.simple_cron.add('c', self.callback, seconds=10)
+        self.simple_cron.run_callbacks(0, 0, 0, 10)
+        # The ID of "a" is used by the records in the buffer.
+        self.assertEqual(sorted(trace_log.names), ['a', 'b', 'c'])
+        self.assertEqual(trace_log.get_job_id('c'), 2)
+
+        self.simple_cron.remove('c')
+        self.simple_cron.add('d', self.callback, seconds=10)
+        # The oldest records are overwritten, the records of "b" and "d" use the IDs of "a" and "b".
+        self.simple_cron.run_callbacks(0, 0, 0, 10)
+        self.assertEqual(sorted(trace_log.names), ['b', 'c', 'd'])
+        self.assertEqual(trace_log.get_job_id('d'), job_id)
+        self.assertEqual(
+            sorted(record[2] for record in trace.iter_records(trace_log) if record[1] == trace.EVENT_CALLBACK),
+            ['b', 'd']
+        )
+
+    def test_job_ids__all_used(self):
+        from scron import trace
+        trace_log = trace.Trace(records=4)
+        for job_id in range(trace.OTHER_JOB):
+            trace_log.get_job_id(job_id)
+        # The ID does not overflow the record.
+        trace_log.write(trace.EVENT_CALLBACK, trace_log.get_job_id('a'), 100)
+        self.assertEqual(trace_log.get_job_id('a'), trace.OTHER_JOB)
+        self.assertEqual(list(trace.iter_records(trace_log))[0][1:4], (trace.EVENT_CALLBACK, None, 100))
+
+    def test_save_load(self):
+        try:
+            from io import BytesIO
+        except ImportError:
+            from uio import BytesIO
+        from scron import trace
+        trace_log = trace.Trace(records=8)
+        trace_log.write(trace.EVENT_CALLBACK, trace_log.get_job_id('abc'), 1500, -32)
+        trace_log.write(trace.EVENT_RESCHEDULE, trace.NO_JOB, 1000)
+
+        stream = BytesIO()
+        trace.save(trace_log, stream)
+        stream.seek(0)
+        loaded = trace.load(stream)
+        self.assertEqual(list(trace.iter_records(loaded)), list(trace.iter_records(trace_log)))
+        self.assertEqual(
+            [record[1:] for record in trace.iter_records(loaded)],
+            [(trace.EVENT_CALLBACK, 'abc', 1500, -32), (trace.EVENT_RESCHEDULE, None, 1000, 0)]
+        )
+
+
 class TestDecoratorsCRON(unittest.TestCase):
 
     def test_run_times(self):
@@ -903,6 +2176,147 @@ class TestDecoratorsCRON(unittest.TestCase):
         self.assertEqual(sec, 1)
         self.assertTrue(505 > msec >= 500, msg="505 > %d ms >= 500" % msec)
 
+    def overrun_calls(self, policy, queue_size=1):
+        # The first call starts three next calls, while it is still running.
+        calls = []
+
+        @overrun(policy, queue_size)
+        def some_call(scorn_instance, callback_name, pointer, memory):
+            calls.append(pointer)
+            if pointer == (0, 0, 0, 1):
+                for second in (2, 3, 4):
+                    some_call(scorn_instance, callback_name, (0, 0, 0, second), memory)
+
+        memory = {}
+        some_call(None, 'abc', (0, 0, 0, 1), memory)
+        return calls, memory
+
+    def test_overrun__skip(self):
+        calls, memory = self.overrun_calls(overrun.SKIP)
+        self.assertEqual(calls, [(0, 0, 0, 1)])
+        self.assertEqual(memory[overrun.RUNNING_ID], 0)
+        self.assertEqual(memory[overrun.SKIPPED_ID], 3)
+        self.assertEqual(memory[overrun.COALESCED_ID], 0)
+
+    def test_overrun__coalesce(self):
+        calls, memory = self.overrun_calls(overrun.COALESCE)
+        self.assertEqual(calls, [(0, 0, 0, 1), (0, 0, 0, 4)])
+        self.assertEqual(memory[overrun.RUNNING_ID], 0)
+        self.assertEqual(memory[overrun.SKIPPED_ID], 0)
+        self.assertEqual(memory[overrun.COALESCED_ID], 2)
+
+    def test_overrun__queue(self):
+        calls, memory = self.overrun_calls(overrun.QUEUE, 2)
+        self.assertEqual(calls, [(0, 0, 0, 1), (0, 0, 0, 2), (0, 0, 0, 3)])
+        self.assertEqual(memory[overrun.RUNNING_ID], 0)
+        self.assertEqual(memory[overrun.SKIPPED_ID], 1)
+        self.assertEqual(memory[overrun.COALESCED_ID], 0)
+
+    def test_overrun__concurrent(self):
+        calls, memory = self.overrun_calls(overrun.CONCURRENT)
+        self.assertEqual(calls, [(0, 0, 0, 1), (0, 0, 0, 2), (0, 0, 0, 3), (0, 0, 0, 4)])
+        self.assertEqual(memory[overrun.RUNNING_ID], 0)
+        self.assertEqual(memory[overrun.SKIPPED_ID], 0)
+
+    def test_overrun__exception(self):
+        @overrun(overrun.SKIP)
+        def some_call(scorn_instance, callback_name, pointer, memory):
+            raise Exception('abc')
+
+        memory = {}
+        with self.assertRaises(Exception):
+            some_call(None, 'abc', (0, 0, 0, 0), memory)
+        self.assertEqual(memory[overrun.RUNNING_ID], 0)
+
+        with self.assertRaises(Exception):
+            overrun('abc')
+
+    def test_overrun__exception_of_waiting_call(self):
+        errors = []
+
+        class scron_instance:
+            callback_exception_processors = [errors.append]
+
+        @overrun(overrun.QUEUE, 2)
+        def some_call(scorn_instance, callback_name, pointer, memory):
+            if pointer == (0, 0, 0, 1):
+                for second in (2, 3):
+                    some_call(scorn_instance, callback_name, (0, 0, 0, second), memory)
+            if pointer[3] in (1, 3):
+                raise Exception(pointer[3])
+
+        # The exception of a call followed by a waiting call is reported once, the last one is raised.
+        memory = {}
+        with self.assertRaises(Exception) as context:
+            some_call(scron_instance, 'abc', (0, 0, 0, 1), memory)
+        self.assertEqual(context.exception.args, (3,))
+        self.assertEqual([e.args for e in errors], [(1,)])
+        self.assertEqual(memory[overrun.RUNNING_ID], 0)
+
+        # The successful last call does not raise the exception of the first one.
+        del errors[:]
+
+        @overrun(overrun.COALESCE)
+        def other_call(scorn_instance, callback_name, pointer, memory):
+            if pointer == (0, 0, 0, 1):
+                other_call(scorn_instance, callback_name, (0, 0, 0, 2), memory)
+                raise Exception(1)
+
+        self.assertIsNone(other_call(scron_instance, 'abc', (0, 0, 0, 1), {}))
+        self.assertEqual([e.args for e in errors], [(1,)])
+
+    def test_overrun__coroutine_exception(self):
+        try:
+            import asyncio
+        except ImportError:
+            import uasyncio as asyncio
+        errors = []
+
+        class scron_instance:
+            callback_exception_processors = [errors.append]
+
+        @overrun(overrun.COALESCE)
+        async def some_call(scorn_instance, callback_name, pointer, memory):
+            await asyncio.sleep(0.01)
+            if pointer == (0, 0, 0, 1):
+                raise Exception(1)
+
+        async def main():
+            memory = {}
+            first = some_call(scron_instance, 'abc', (0, 0, 0, 1), memory)
+            some_call(scron_instance, 'abc', (0, 0, 0, 2), memory)
+            # The second call succeeds, so the exception of the first one is only reported.
+            await first
+
+        asyncio.run(main())
+        self.assertEqual([e.args for e in errors], [(1,)])
+
+    def test_overrun__coroutine(self):
+        try:
+            import asyncio
+        except ImportError:
+            import uasyncio as asyncio
+        calls = []
+
+        @overrun(overrun.COALESCE)
+        async def some_call(scorn_instance, callback_name, pointer, memory):
+            calls.append(pointer)
+            await asyncio.sleep(0.01)
+
+        memory = {}
+
+        async def main():
+            first = some_call(None, 'abc', (0, 0, 0, 1), memory)
+            self.assertEqual(memory[overrun.RUNNING_ID], 1)
+            for second in (2, 3):
+                self.assertIsNone(some_call(None, 'abc', (0, 0, 0, second), memory))
+            await first
+
+        asyncio.run(main())
+        self.assertEqual(calls, [(0, 0, 0, 1), (0, 0, 0, 3)])
+        self.assertEqual(memory[overrun.RUNNING_ID], 0)
+        self.assertEqual(memory[overrun.COALESCED_ID], 1)
+
 
 class TestIntegrationTests(unittest.TestCase):
     pass
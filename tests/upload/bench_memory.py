@@ -0,0 +1,78 @@
+import gc
+
+from scron.week import SimpleCRON
+from scron.bitmask import BitmaskTimeTable
+from scron.compact import CompactTimeTable
+
+JOBS = 40
+
+try:
+    gc.mem_alloc
+
+
+    def mem_alloc():
+        gc.collect()
+        return gc.mem_alloc()
+
+except AttributeError:
+    # Python 3
+    import tracemalloc
+
+    tracemalloc.start()
+
+
+    def mem_alloc():
+        gc.collect()
+        return tracemalloc.get_traced_memory()[0]
+
+
+def callback(scorn_instance, callback_name, pointer, memory):
+    pass
+
+
+def add_jobs(simple_cron):
+    """\
+    Adds the jobs and returns a call pointer of each of them.
+    """
+    pointers = []
+    for job in range(JOBS):
+        if job % 4 == 0:
+            # 30 second values across all hours
+            simple_cron.add('job%d' % job, callback, seconds=range(job % 2, 60, 2))
+            pointers.append((0, 0, 0, job % 2))
+        elif job % 4 == 1:
+            simple_cron.add('job%d' % job, callback, seconds=job, minutes=range(0, 60, 5), hours=range(8, 20))
+            pointers.append((0, 8, 0, job))
+        elif job % 4 == 2:
+            simple_cron.add('job%d' % job, callback, seconds=0, minutes=job, hours=[6, 18], weekdays=range(0, 5))
+            pointers.append((0, 6, job, 0))
+        else:
+            simple_cron.add('job%d' % job, callback, seconds=job, minutes=30)
+            pointers.append((0, 0, 30, job))
+    return pointers
+
+
+def bench(name, time_table_engine=None, stats=False):
+    # It includes the callbacks dictionaries of SimpleCRON.
+    before_cron = mem_alloc()
+    simple_cron = SimpleCRON(time_table_engine=time_table_engine)
+    simple_cron.STATS = stats
+    empty = mem_alloc() - before_cron
+    pointers = add_jobs(simple_cron)
+    # The first lookup builds the index of the time table (if the engine uses it), which stays in the memory.
+    simple_cron.get_next_pointer(0, 8, 0, 0)
+    # Every job is called once, so the memory allocated at the first call of each job is counted.
+    for pointer in pointers:
+        simple_cron.run_callbacks(*pointer)
+    del pointers, pointer
+    used = mem_alloc() - before_cron - empty
+    print('%-16s %7d bytes, %5d bytes per job' % (name, used, used // JOBS))
+    del simple_cron
+    gc.collect()
+
+
+print('Memory used by %d jobs:' % JOBS)
+bench('tree')
+bench('bitmask', BitmaskTimeTable)
+bench('compact', CompactTimeTable)
+bench('compact + stats', CompactTimeTable, stats=True)